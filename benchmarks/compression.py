@@ -0,0 +1,69 @@
+"""
+Compares the installed codecs on a list of contact records like the ones
+returned by the contacts service: compression ratio and the time spent
+compressing and decompressing the body, at a few levels of every codec.
+
+    python benchmarks/compression.py [records]
+"""
+from __future__ import print_function, unicode_literals
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+LEVELS = {
+    'gzip': (1, 6, 9),
+    'br': (1, 5, 11),
+    'zstd': (1, 3, 9),
+}
+
+
+def body(records):
+    content = [{
+        'idContact': i,
+        'idMember': 1 + i % 7,
+        'name': 'Contact %d' % i,
+        'email': 'contact%d@example.com' % i,
+        'phone': '+353 1 %07d' % (i * 7919 % 10000000),
+        'idAddress': 1000 + i,
+        'created': '2024-01-%02dT10:%02d:00Z' % (1 + i % 28, i % 60),
+        'updated': '2024-06-%02dT12:%02d:00Z' % (1 + i % 28, i % 60),
+        'notes': None if i % 3 else 'Imported from CRM batch %d' % (i // 100),
+    } for i in range(records)]
+    return json.dumps({'_metadata': {'totalRecords': records},
+                       'content': content}).encode('utf-8')
+
+
+def timed(func, *args):
+    rounds = 0
+    started = time.time()
+    while True:
+        result = func(*args)
+        rounds += 1
+        elapsed = time.time() - started
+        if elapsed > 0.2:
+            return result, elapsed / rounds
+
+
+def main():
+    from cloudcix.compression import CODECS, available_codecs
+
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    data = body(records)
+    print('%d records, %d bytes' % (records, len(data)))
+    print('%-6s %5s %9s %7s %12s %12s' % (
+        'codec', 'level', 'bytes', 'ratio', 'compress', 'decompress'))
+    for name in available_codecs():
+        compress, decompress, _ = CODECS[name]
+        for level in LEVELS[name]:
+            compressed, compress_time = timed(compress, data, level)
+            _, decompress_time = timed(decompress, compressed)
+            print('%-6s %5d %9d %6.1fx %10.0fus %10.0fus' % (
+                name, level, len(compressed), len(data) / len(compressed),
+                compress_time * 1e6, decompress_time * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures the client side overhead of every transport: the wall time and the
+CPU time spent per APIClient call against a local server (running in its own
+process) answering with a small JSON body.
+
+    python benchmarks/transport.py [calls]
+"""
+from __future__ import print_function, unicode_literals
+import multiprocessing
+import os
+import sys
+import time
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+BODY = b'{"content": [{"idLanguage": 1, "name": "English"}]}'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(server):
+    server.serve_forever()
+
+
+def cpu_time():
+    times = os.times()
+    return times[0] + times[1]
+
+
+def main(calls=2000):
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    process = multiprocessing.Process(target=serve, args=(server,))
+    process.daemon = True
+    process.start()
+    server_url = 'http://127.0.0.1:%d' % server.server_address[1]
+    os.environ.setdefault('CLOUDCIX_SERVER_URL', server_url)
+
+    from cloudcix.base import APIClient
+    from cloudcix.transport import TRANSPORTS
+
+    print('%-10s %14s %14s' % ('transport', 'wall us/call', 'cpu us/call'))
+    try:
+        for name, transport_class in sorted(TRANSPORTS.items()):
+            try:
+                transport = transport_class()
+            except ImportError:
+                print('%-10s %14s' % (name, 'not installed'))
+                continue
+            client = APIClient('Membership', 'Language/',
+                               server_url=server_url, transport=transport)
+            for _ in range(50):
+                client.list(token='token').json()
+            started, started_cpu = time.time(), cpu_time()
+            for _ in range(calls):
+                client.list(token='token').json()
+            wall = time.time() - started
+            cpu = cpu_time() - started_cpu
+            print('%-10s %14.1f %14.1f' % (name, wall / calls * 1e6,
+                                           cpu / calls * 1e6))
+            transport.close()
+    finally:
+        process.terminate()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -1,5 +1,7 @@
 # python
 from __future__ import unicode_literals
+import inspect
+import sys
 
 # libs
 
@@ -105,3 +107,19 @@ class app_manager(object):
                     service_uri='App/')
     app_menu = APIClient(application='AppManager',
                          service_uri='App/%(idApp)s/MenuItem/')
+
+
+def get_services():
+    """Returns every client defined in this module.
+
+    :returns: dict of "application.service" names and clients,
+              eg. {'membership.user': <APIClient(...)>}
+    :rtype: dict
+    """
+    services = dict()
+    module = sys.modules[__name__]
+    for app_name, app in inspect.getmembers(module, inspect.isclass):
+        for name, client in vars(app).items():
+            if isinstance(client, APIClient):
+                services['%s.%s' % (app_name, name)] = client
+    return services
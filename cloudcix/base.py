@@ -5,17 +5,26 @@ import os
 import re
 
 # libs
-import requests
 from requests.auth import AuthBase
 
 # local
+from . import deadline
+from .compression import get_default_compression
+from .scheduler import QueueTimeout, current_priority, get_default_scheduler
+from .transport import get_default_transport
 from .utils import settings
+from .watch import Watcher
 
 try:
     CLOUDCIX_SERVER_URL = getattr(settings, 'CLOUDCIX_SERVER_URL', None)
 except ImportError:
     CLOUDCIX_SERVER_URL = os.environ['CLOUDCIX_SERVER_URL']
 
+try:
+    CLOUDCIX_TIMEOUT = getattr(settings, 'CLOUDCIX_TIMEOUT', None)
+except ImportError:
+    CLOUDCIX_TIMEOUT = os.environ.get('CLOUDCIX_TIMEOUT')
+
 
 class TokenAuth(AuthBase):
     """Requests authentication object"""
@@ -29,9 +38,13 @@ class TokenAuth(AuthBase):
 
 
 class APIClient(object):
+    #: Query params used to page through collections
+    page_param = 'page'
+    limit_param = 'limit'
+    first_page = 0
 
     def __init__(self, application, service_uri, server_url=None,
-                 api_version='v1'):
+                 api_version='v1', transport=None, compression=None):
         """Initialises the APIClient with details necessary for the call
 
         :param application: Application name that will be used as part of
@@ -47,6 +60,13 @@ class APIClient(object):
         :param api_version: Version of the service that should be used,
                             eg. "v1", default: "v1"
         :type api_version: str | unicode
+        :param transport: Optional, transport sending the requests,
+                          default: cloudcix.transport.get_default_transport()
+        :type transport: cloudcix.transport.Transport
+        :param compression: Optional, compression of requests and responses,
+                            default:
+                            cloudcix.compression.get_default_compression()
+        :type compression: cloudcix.compression.Compression
         """
         self.application = application
         self.headers = {
@@ -55,12 +75,38 @@ class APIClient(object):
         self.service_uri = service_uri
         self.server_url = server_url or self._get_server_url
         self.api_version = api_version
+        self._transport = transport
+        self._compression = compression
+        self._service_args = None
 
     def __repr__(self):
         return u'<APIClient(%s)>' % "/".join([
             self.server_url, self.application, self.api_version,
             self.service_uri])
 
+    def compile(self):
+        """Parses the service uri once, instead of on every call."""
+        pattern = re.compile(r'(?<=/\%\()(?P<match>\w+)(?=\)s/)')
+        self._service_args = frozenset(pattern.findall(self.service_uri))
+
+    @property
+    def transport(self):
+        """Transport sending the requests of this client"""
+        return self._transport or get_default_transport()
+
+    @transport.setter
+    def transport(self, transport):
+        self._transport = transport
+
+    @property
+    def compression(self):
+        """Compression settings of this client"""
+        return self._compression or get_default_compression()
+
+    @compression.setter
+    def compression(self, compression):
+        self._compression = compression
+
     @property
     def _get_server_url(self):
         """Returns the CloudCIX server url.
@@ -85,7 +131,7 @@ class APIClient(object):
                        /Membership/v1/Member/<idMember>/Territories/
                        you should pass in idMember=xxx as part of kwargs.
                        Additionally any other parameters that should be passed
-                       to requests library call
+                       to the transport, see cloudcix.transport
         :returns: requests.Response
         """
         return self._call('post', token, data=data, params=params, **kwargs)
@@ -105,7 +151,7 @@ class APIClient(object):
                        /Membership/v1/Member/<idMember>/Territories/
                        you should pass in idMember=xxx as part of kwargs.
                        Additionally any other parameters that should be passed
-                       to requests library call
+                       to the transport, see cloudcix.transport
         :returns: requests.Response
         """
         return self._call('get', token, pk, params=params, **kwargs)
@@ -126,7 +172,7 @@ class APIClient(object):
                        /Membership/v1/Member/<idMember>/Territories/
                        you should pass in idMember=xxx as part of kwargs.
                        Additionally any other parameters that should be passed
-                       to requests library call
+                       to the transport, see cloudcix.transport
         :returns: requests.Response
         """
         return self._call('put', token, pk, data=data, params=params, **kwargs)
@@ -148,7 +194,7 @@ class APIClient(object):
                        /Membership/v1/Member/<idMember>/Territories/
                        you should pass in idMember=xxx as part of kwargs.
                        Additionally any other parameters that should be passed
-                       to requests library call
+                       to the transport, see cloudcix.transport
         :returns: requests.Response
         """
         return self._call('patch', token, pk, data=data, params=params,
@@ -169,7 +215,7 @@ class APIClient(object):
                        /Membership/v1/Member/<idMember>/Territories/
                        you should pass in idMember=xxx as part of kwargs.
                        Additionally any other parameters that should be passed
-                       to requests library call
+                       to the transport, see cloudcix.transport
         :returns: requests.Response
         """
         return self._call('delete', token, pk, params=params, **kwargs)
@@ -188,7 +234,7 @@ class APIClient(object):
                        /Membership/v1/Member/<idMember>/Territories/
                        you should pass in idMember=xxx as part of kwargs.
                        Additionally any other parameters that should be passed
-                       to requests library call
+                       to the transport, see cloudcix.transport
         :returns: requests.Response
         """
         return self._call('delete', token, params=params, **kwargs)
@@ -206,11 +252,87 @@ class APIClient(object):
                        /Membership/v1/Member/<idMember>/Territories/
                        you should pass in idMember=xxx as part of kwargs.
                        Additionally any other parameters that should be passed
-                       to requests library call
+                       to the transport, see cloudcix.transport
         :returns: requests.Response
         """
         return self._call('get', token, params=params, **kwargs)
 
+    def iter_pages(self, token=None, params=None, page_size=100,
+                   start_page=None, **kwargs):
+        """Iterates over a collection one page at a time.
+
+        :param token: Optional, Token to be used for the request.
+                      Must be present if method requires authentication.
+        :type token: str | unicode
+        :param dict params: Optional, Query params to be sent along with the
+                            request.
+        :param int page_size: Optional, number of records requested per page,
+                              default: 100
+        :param int start_page: Optional, page to start from, default: first
+                               page of the collection
+        :param kwargs: Same as for the list method
+        :returns: Generator yielding lists of records
+        :raises requests.HTTPError: when a page can't be retrieved
+        """
+        params = dict(params or {})
+        page = self.first_page if start_page is None else start_page
+        fetched = 0
+        while True:
+            deadline.check()
+            params[self.page_param] = page
+            params[self.limit_param] = page_size
+            response = self.list(token=token, params=params, **kwargs)
+            response.raise_for_status()
+            body = response.json()
+            records = body['content']
+            if records:
+                yield records
+            fetched += len(records)
+            total = body.get('_metadata', {}).get('totalRecords')
+            if total is None:
+                # without a total, a short page is the last one
+                if len(records) < page_size:
+                    return
+            elif fetched >= total or not records:
+                # the server may cap the page size below page_size
+                return
+            page += 1
+
+    def iter_list(self, token=None, params=None, page_size=100, **kwargs):
+        """Iterates over all the records of a collection, fetching them a
+        page at a time.
+
+        :param token: Optional, Token to be used for the request.
+                      Must be present if method requires authentication.
+        :type token: str | unicode
+        :param dict params: Optional, Query params to be sent along with the
+                            request.
+        :param int page_size: Optional, number of records requested per page,
+                              default: 100
+        :param kwargs: Same as for the list method
+        :returns: Generator yielding records
+        :raises requests.HTTPError: when a page can't be retrieved
+        """
+        for records in self.iter_pages(token, params, page_size, **kwargs):
+            for record in records:
+                yield record
+
+    def watch(self, pk_field, token=None, params=None, **kwargs):
+        """Returns a watcher emitting the changes made to the collection.
+
+        :param pk_field: Name of the field holding the primary key of the
+                         records, eg. "idUser"
+        :type pk_field: str | unicode
+        :param token: Optional, Token to be used for the request.
+                      Must be present if method requires authentication.
+        :type token: str | unicode
+        :param dict params: Optional, Query params limiting the watched
+                            records.
+        :param kwargs: Any other argument accepted by cloudcix.watch.Watcher
+        :returns: cloudcix.watch.Watcher
+        """
+        return Watcher(self, pk_field, token=token, params=params, **kwargs)
+
     def head(self, pk=None, token=None, params=None, **kwargs):
         """Used to check existence of a resource/collection.
 
@@ -230,14 +352,14 @@ class APIClient(object):
                        /Membership/v1/Member/<idMember>/Territories/
                        you should pass in idMember=xxx as part of kwargs.
                        Additionally any other parameters that should be passed
-                       to requests library call
+                       to the transport, see cloudcix.transport
         :returns: requests.Response
         """
         return self._call('head', token, pk, params=params, **kwargs)
 
     def _call(self, method, token=None, pk=None, data=None, params=None,
               **kwargs):
-        """Does the actual call using the requests lib.
+        """Does the actual call using the transport of the client.
 
         :param method: on of the supported http request methods
         :type method: str | unicode | int
@@ -248,22 +370,61 @@ class APIClient(object):
                           contain only the values that are to be updated.
         :param dict params: Optional, Query params to be sent along with the
                             request.
-        :param kwargs: Any additional that should be passed to requests library
-                       call
+        :param kwargs: Any additional that should be passed to the transport
+                       (any argument of requests.request with the default
+                       transport, see cloudcix.transport). The lane of
+                       the call can be given as priority, see
+                       cloudcix.scheduler. The timeout (default: the
+                       CLOUDCIX_TIMEOUT setting), in seconds or as a
+                       (connect, read) tuple, is capped by the remaining
+                       budget of the current cloudcix.deadline.Deadline.
         :returns: requests.Response
+        :raises cloudcix.deadline.DeadlineExceeded: when the deadline passed
+                                                    before the call could
+                                                    start
         """
         data = data or {}
+        lane = kwargs.pop('priority', None) or current_priority()
         service_kwargs, kwargs = self.filter_service_kwargs(kwargs)
-        if 'headers' in kwargs:
-            kwargs['headers'].updated(self.headers)
-        else:
-            kwargs['headers'] = self.headers
+        headers = dict(self.headers)
+        headers.update(kwargs.pop('headers', None) or {})
         if token:
-            kwargs['auth'] = TokenAuth(token)
+            headers['X-Auth-Token'] = token
         uri = self.get_uri(pk, service_kwargs)
-        data = json.dumps(data)
-        return getattr(requests, method)(uri, data=data, params=params,
-                                         **kwargs)
+        transport = self.transport
+        compression = self.compression
+        accept_encoding = compression.accept_encoding(transport)
+        if accept_encoding:
+            headers.setdefault('Accept-Encoding', accept_encoding)
+        data, content_encoding = compression.encode(
+            json.dumps(data).encode('utf-8'))
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
+        if transport.templates:
+            kwargs['template'] = "/".join([
+                self.application, self.api_version,
+                self.service_uri if pk is None else
+                self.service_uri + '%(pk)s/'])
+        timeout = kwargs.pop('timeout', CLOUDCIX_TIMEOUT)
+        # (connect, read) tuples are passed on as they are
+        if timeout is not None and not isinstance(timeout, tuple):
+            timeout = float(timeout)
+        scheduler = get_default_scheduler()
+        if scheduler is None:
+            return transport.request(
+                method, uri, headers, data=data, params=params,
+                timeout=deadline.timeout_for(timeout), **kwargs)
+        try:
+            scheduler.acquire(lane, deadline.remaining())
+        except QueueTimeout:
+            deadline.check()
+            raise
+        try:
+            return transport.request(
+                method, uri, headers, data=data, params=params,
+                timeout=deadline.timeout_for(timeout), **kwargs)
+        finally:
+            scheduler.release(lane)
 
     def filter_service_kwargs(self, kwargs):
         """Filters out kwargs required by the service uri from general kwargs.
@@ -277,8 +438,9 @@ class APIClient(object):
                              out
         :rtype: (dict, dict)
         """
-        pattern = re.compile(r'(?<=/\%\()(?P<match>\w+)(?=\)s/)')
-        result = pattern.findall(self.service_uri)
+        if self._service_args is None:
+            self.compile()
+        result = self._service_args
         service_kwargs = dict((k, v) for k, v in kwargs.items() if k in result)
         kwargs = dict(filter(lambda i: i[0] not in result, kwargs.items()))
         return service_kwargs, kwargs
@@ -0,0 +1,151 @@
+# python
+from __future__ import unicode_literals
+from multiprocessing.pool import ThreadPool
+import itertools
+import logging
+import threading
+import time
+
+# libs
+
+# local
+from . import deadline
+from .scheduler import current_priority, priority
+
+__all__ = ['BatchResult', 'bulk_data', 'chunked', 'run_batches']
+
+_logger = logging.getLogger(__name__)
+
+
+def chunked(iterable, size):
+    """Splits the iterable into lists of at most size elements, without
+    reading more than one chunk ahead.
+
+    :param iterable: Any iterable, eg. a generator streaming records
+    :param int size: Maximum length of the chunks
+    :returns: Generator yielding lists
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_data(items):
+    """Returns the body of a create call for a chunk of items: the list for
+    a bulk create, or the item itself when the chunk has a single one.
+
+    :param list items: Data of the objects to create, at least one
+    :rtype: list | dict
+    """
+    return items if len(items) > 1 else items[0]
+
+
+class BatchResult(object):
+    """Outcome of run_batches"""
+
+    def __init__(self):
+        self.batches = 0
+        self.items = 0
+        self.errors = list()
+        self.complete = True
+        self.started = time.time()
+        self.finished = None
+
+    def __repr__(self):
+        return u'<BatchResult(%d items, %d failed batches, %.1fs)>' % (
+            self.items, len(self.errors), self.elapsed)
+
+    @property
+    def failed_items(self):
+        return sum(len(batch) for batch, _ in self.errors)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rate(self):
+        """Items processed per second"""
+        return self.items / self.elapsed if self.elapsed else 0.0
+
+
+def _run(func, batch, lane):
+    try:
+        # work queued when the deadline passed is cancelled
+        deadline.check()
+        with priority(lane):
+            func(batch)
+    except Exception as e:
+        _logger.debug('Batch of %d items failed: %s', len(batch), e)
+        return batch, e
+    return batch, None
+
+
+def _acquire(slots):
+    """Waits for a free slot until the current deadline, if any"""
+    while True:
+        remaining = deadline.remaining()
+        if remaining is None:
+            return slots.acquire()
+        if remaining <= 0:
+            return False
+        if slots.acquire(False):
+            return True
+        time.sleep(min(remaining, 0.01))
+
+
+def run_batches(func, batches, concurrency=8, progress=None):
+    """Calls func with every batch, running at most concurrency calls at a
+    time. Batches are consumed only as fast as they are processed, so a
+    generator can stream any number of them.
+
+    A batch fails when func raises, the error is recorded and the remaining
+    batches are still processed. Calls made by func run in the priority lane
+    and within the deadline of the calling thread. Once the deadline passes
+    no more batches are read, queued batches fail with DeadlineExceeded and
+    the result is marked as not complete.
+
+    :param func: Callable accepting a batch (a list of items)
+    :param batches: Iterable of lists, eg. chunked(records, 100)
+    :param int concurrency: Optional, maximum number of concurrent calls,
+                            default: 8
+    :param progress: Optional, callable receiving the BatchResult every time
+                     a batch is done
+    :returns: BatchResult
+    """
+    result = BatchResult()
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def done(outcome):
+        batch, error = outcome
+        with lock:
+            result.batches += 1
+            result.items += len(batch)
+            if error is not None:
+                result.errors.append((batch, error))
+        try:
+            if progress is not None:
+                progress(result)
+        except Exception:
+            _logger.exception('Progress callback failed')
+        finally:
+            slots.release()
+
+    lane = current_priority()
+    func = deadline.bind(func)
+    pool = ThreadPool(concurrency)
+    try:
+        for batch in batches:
+            if not _acquire(slots):
+                result.complete = False
+                break
+            pool.apply_async(_run, (func, batch, lane), callback=done)
+    finally:
+        pool.close()
+        pool.join()
+    result.finished = time.time()
+    return result
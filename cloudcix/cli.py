@@ -0,0 +1,338 @@
+# python
+from __future__ import print_function, unicode_literals
+from multiprocessing.pool import ThreadPool
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+
+# libs
+
+# local
+from . import __version__
+from .api import get_services
+from .batch import bulk_data, chunked, run_batches
+from .deadline import Deadline, DeadlineExceeded, bind, current_deadline
+from .scheduler import BATCH, current_priority, priority
+
+__all__ = ['main']
+
+_logger = logging.getLogger(__name__)
+
+
+def _key_value(value):
+    """Parses a key=value command line argument"""
+    key, sep, val = value.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError('expected KEY=VALUE, got %s' % value)
+    return key, val
+
+
+def _get_token(args):
+    if args.token:
+        return args.token
+    if os.environ.get('CLOUDCIX_TOKEN'):
+        return os.environ['CLOUDCIX_TOKEN']
+    from .utils import get_admin_session
+    return get_admin_session().get_token()
+
+
+def _write_checkpoint(path, state):
+    tmp = '%s.tmp' % path
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.rename(tmp, path)
+
+
+def _summary(action, service, records, failed, started, unit='records'):
+    elapsed = time.time() - started
+    print('%s %s: %d records, %d %s failed in %.1fs (%.1f records/s)' % (
+        action, service, records, failed, unit, elapsed,
+        records / elapsed if elapsed else 0.0), file=sys.stderr)
+
+
+def _print_errors(errors):
+    """Prints how many times every error happened, most frequent first"""
+    counts = dict()
+    for error in errors:
+        counts[str(error)] = counts.get(str(error), 0) + 1
+    for error, count in sorted(counts.items(), key=lambda i: -i[1]):
+        print('%d x %s' % (count, error), file=sys.stderr)
+
+
+def _with_retries(call, retries):
+    """Makes the call, retrying connection errors and 5xx responses with an
+    exponential back off, as long as the retry ends before the deadline.
+
+    :param call: Callable returning a response
+    :param int retries: Maximum number of retries
+    :raises requests.HTTPError: when the last response is an error
+    """
+    deadline = current_deadline()
+    for attempt in range(retries + 1):
+        delay = 2 ** attempt * 0.1
+        # no retry that would end after the deadline
+        last = attempt == retries or (
+            deadline is not None and not deadline.allows(delay))
+        try:
+            response = call()
+        except DeadlineExceeded:
+            raise
+        except IOError:
+            # connection errors are worth a retry, anything else isn't
+            if last:
+                raise
+        else:
+            if response.status_code < 500 or last:
+                break
+        time.sleep(delay)
+    response.raise_for_status()
+    return response
+
+
+def export(args):
+    """Streams a service into a gzip compressed NDJSON file, fetching up to
+    concurrency pages at a time. Every batch of pages is written as its own
+    gzip member, and the checkpoint file records the next page to fetch and
+    the size of the output once the batch is complete. --resume truncates
+    the output to that size, dropping a batch cut short by a crash, and
+    continues from there.
+    """
+    client = get_services()[args.service]
+    token = _get_token(args)
+    params = dict(args.param or [])
+    service_kwargs = dict(args.arg or [])
+    checkpoint = args.checkpoint or '%s.checkpoint' % args.output
+    state = {'service': args.service, 'page': client.first_page,
+             'records': 0, 'offset': 0}
+    if args.resume and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            state = json.load(f)
+        if state['service'] != args.service:
+            print('%s is a checkpoint of %s, not %s' % (
+                checkpoint, state['service'], args.service), file=sys.stderr)
+            return 2
+        if not os.path.exists(args.output):
+            print('Cannot resume, %s does not exist' % args.output,
+                  file=sys.stderr)
+            return 2
+        print('Resuming %s from page %d' % (args.service, state['page']),
+              file=sys.stderr)
+        output = open(args.output, 'r+b')
+        output.truncate(state['offset'])
+        output.seek(state['offset'])
+    else:
+        output = open(args.output, 'wb')
+
+    lane = current_priority()
+
+    @bind
+    def fetch(page):
+        try:
+            with priority(lane):
+                return fetch_page(page), None
+        except Exception as e:
+            return None, e
+
+    def fetch_page(page):
+        page_params = dict(params)
+        page_params[client.page_param] = page
+        page_params[client.limit_param] = args.page_size
+        body = _with_retries(lambda: client.list(
+            token=token, params=page_params, **service_kwargs),
+            args.retries).json()
+        return body['content'], body.get('_metadata', {}).get('totalRecords')
+
+    started = time.time()
+    exported = 0
+    errors = list()
+    pool = ThreadPool(args.concurrency)
+    try:
+        finished = False
+        while not finished:
+            pages = list(range(state['page'],
+                               state['page'] + args.concurrency))
+            outcomes = list(zip(pages, pool.map(fetch, pages)))
+            # gzip members can be concatenated, every batch is closed as one
+            member = gzip.GzipFile(fileobj=output, mode='wb')
+            for i, (page, (result, error)) in enumerate(outcomes):
+                if error is not None:
+                    errors = [(p, e) for p, (_, e) in outcomes[i:]
+                              if e is not None]
+                    finished = True
+                    break
+                records, total = result
+                for record in records:
+                    member.write(json.dumps(record).encode('utf-8') + b'\n')
+                exported += len(records)
+                state['page'] = page + 1
+                state['records'] += len(records)
+                # same rules as APIClient.iter_pages
+                if total is None:
+                    finished = len(records) < args.page_size
+                else:
+                    finished = state['records'] >= total or not records
+                if finished:
+                    break
+            member.close()
+            output.flush()
+            os.fsync(output.fileno())
+            state['offset'] = output.tell()
+            _write_checkpoint(checkpoint, state)
+    finally:
+        output.close()
+        pool.close()
+        pool.join()
+
+    for page, error in errors:
+        if isinstance(error, DeadlineExceeded):
+            raise error
+    if errors:
+        _print_errors(error for _, error in errors)
+        print('Export stopped at page %d, rerun with --resume to continue' %
+              state['page'], file=sys.stderr)
+    else:
+        os.remove(checkpoint)
+    _summary('Exported', args.service, exported, len(errors), started,
+             'pages')
+    return 1 if errors else 0
+
+
+def _read_records(path, exclude):
+    with gzip.open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line.decode('utf-8'))
+                for field in exclude:
+                    record.pop(field, None)
+                yield record
+
+
+def import_(args):
+    """Creates the records of a gzip compressed NDJSON file, chunk_size
+    records per call with up to concurrency calls at a time. Chunks that still
+    fail after the retries are written to the --failed file.
+    """
+    client = get_services()[args.service]
+    token = _get_token(args)
+    service_kwargs = dict(args.arg or [])
+    started = time.time()
+
+    def create(chunk):
+        data = bulk_data(chunk)
+        _with_retries(lambda: client.create(token=token, data=data,
+                                            **service_kwargs), args.retries)
+
+    def progress(result):
+        if result.batches % 100 == 0:
+            print('%d records, %.1f records/s' % (result.items, result.rate),
+                  file=sys.stderr)
+
+    records = _read_records(args.input, args.exclude or [])
+    result = run_batches(create, chunked(records, args.chunk_size),
+                         args.concurrency, progress)
+    if result.errors:
+        failed = args.failed or '%s.failed.ndjson.gz' % args.service
+        with gzip.open(failed, 'wb') as f:
+            for chunk, error in result.errors:
+                for record in chunk:
+                    f.write(json.dumps(record).encode('utf-8') + b'\n')
+        _print_errors(error for _, error in result.errors)
+        print('Failed records written to %s' % failed, file=sys.stderr)
+    if not result.complete:
+        print('Deadline exceeded, the import is incomplete', file=sys.stderr)
+    _summary('Imported', args.service, result.items - result.failed_items,
+             result.failed_items, started)
+    return 1 if result.errors or not result.complete else 0
+
+
+def services(args):
+    """Lists the services that can be exported and imported"""
+    for name, client in sorted(get_services().items()):
+        print('%-32s %s' % (name, client.service_uri))
+    return 0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='cloudcix',
+        description='Export and import CloudCIX API services as NDJSON.')
+    parser.add_argument('--version', action='version', version=__version__)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('service', help='eg. membership.user')
+    common.add_argument('--token', help='default: $CLOUDCIX_TOKEN or an '
+                                        'admin token from the settings')
+    common.add_argument('--arg', action='append', metavar='KEY=VALUE',
+                        type=_key_value,
+                        help='argument of the service uri, eg. idGroup=12')
+    common.add_argument('--concurrency', type=int, default=4,
+                        help='concurrent requests, default: %(default)s')
+    common.add_argument('--retries', type=int, default=3,
+                        help='retries of failed calls, default: %(default)s')
+    common.add_argument('--deadline', type=float, metavar='SECONDS',
+                        help='stop after this many seconds')
+
+    sub = subparsers.add_parser('services', help=services.__doc__)
+    sub.set_defaults(func=services)
+
+    sub = subparsers.add_parser('export', parents=[common],
+                                help='export a service to NDJSON')
+    sub.add_argument('-o', '--output', required=True,
+                     help='eg. users.ndjson.gz')
+    sub.add_argument('--param', action='append', metavar='KEY=VALUE',
+                     type=_key_value,
+                     help='query param filtering the records')
+    sub.add_argument('--page-size', type=int, default=500,
+                     help='default: %(default)s')
+    sub.add_argument('--checkpoint', help='default: <output>.checkpoint')
+    sub.add_argument('--resume', action='store_true',
+                     help='continue from the checkpoint')
+    sub.set_defaults(func=export)
+
+    sub = subparsers.add_parser('import', parents=[common],
+                                help='import NDJSON into a service')
+    sub.add_argument('input', help='eg. users.ndjson.gz')
+    sub.add_argument('--chunk-size', type=int, default=100,
+                     help='records per create call, default: %(default)s')
+    sub.add_argument('--exclude', action='append', metavar='FIELD',
+                     help='field removed from the records, eg. idUser')
+    sub.add_argument('--failed', help='file receiving the failed records, '
+                                      'default: <service>.failed.ndjson.gz')
+    sub.set_defaults(func=import_)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else
+                        logging.WARNING)
+    if getattr(args, 'service', None) and \
+            args.service not in get_services():
+        print('Unknown service %s, see "cloudcix services"' % args.service,
+              file=sys.stderr)
+        return 2
+    try:
+        with priority(BATCH):
+            if getattr(args, 'deadline', None):
+                with Deadline(args.deadline):
+                    return args.func(args)
+            return args.func(args)
+    except DeadlineExceeded:
+        if args.command == 'export':
+            print('Deadline exceeded, rerun export with --resume to '
+                  'continue', file=sys.stderr)
+        else:
+            print('Deadline exceeded, the %s is incomplete' % args.command,
+                  file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
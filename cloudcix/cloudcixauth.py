@@ -12,6 +12,7 @@ from keystoneclient.i18n import _
 from oslo.config import cfg
 
 # local
+from . import deadline
 
 _logger = logging.getLogger(__name__)
 
@@ -73,6 +74,10 @@ class CloudCIXAuth(Auth):
         if self.scope:
             body['auth']['scope'] = self.scope
 
+        timeout = deadline.timeout_for()
+        if timeout is not None:
+            rkwargs['timeout'] = timeout
+
         _logger.debug('Making authentication request to %s', self.token_url)
         try:
             resp = session.post(self.token_url, json=body, headers=headers,
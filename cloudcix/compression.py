@@ -0,0 +1,190 @@
+# python
+from __future__ import unicode_literals
+import gzip
+import io
+import json
+import os
+import zlib
+
+# libs
+
+# local
+from .utils import settings
+
+__all__ = ['Compression', 'CODECS', 'available_codecs',
+           'get_default_compression', 'set_default_compression']
+
+
+def _gzip_compress(data, level):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb',
+                       compresslevel=6 if level is None else level) as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+def _gzip_decompress(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+def _brotli_compress(data, level):
+    import brotli
+    if level is None:
+        return brotli.compress(data)
+    return brotli.compress(data, quality=level)
+
+
+def _brotli_decompress(data):
+    import brotli
+    return brotli.decompress(data)
+
+
+def _zstd_compress(data, level):
+    import zstandard
+    return zstandard.ZstdCompressor(level=3 if level is None else level) \
+        .compress(data)
+
+
+def _zstd_decompress(data):
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def _installed(module):
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+#: Content codings: (compress(data, level), decompress(data), installed)
+CODECS = {
+    'gzip': (_gzip_compress, _gzip_decompress, lambda: True),
+    'br': (_brotli_compress, _brotli_decompress,
+           lambda: _installed('brotli')),
+    'zstd': (_zstd_compress, _zstd_decompress,
+             lambda: _installed('zstandard')),
+}
+
+
+def available_codecs():
+    """Returns the names of the codecs whose libraries are installed"""
+    return [name for name, codec in sorted(CODECS.items()) if codec[2]()]
+
+
+class Compression(object):
+    """Compression settings of an APIClient.
+
+    Responses: the codecs in accept that the transport can decode are
+    advertised with Accept-Encoding, in order of preference. The transport
+    decodes the response while it is read.
+
+    Requests: bodies of at least threshold bytes are compressed with
+    request_codec, when compress_requests is enabled. Only enable it for
+    services whose server accepts compressed bodies (Content-Encoding).
+
+    Example::
+
+        from cloudcix.compression import Compression
+
+        api.contacts.contact.compression = Compression(
+            compress_requests=True, request_codec='zstd', level=3)
+    """
+
+    def __init__(self, accept=('zstd', 'br', 'gzip', 'deflate'),
+                 compress_requests=False, request_codec='gzip', level=None,
+                 threshold=4096):
+        """
+        :param tuple accept: Optional, content codings accepted in
+                             responses, by preference,
+                             default: ('zstd', 'br', 'gzip', 'deflate')
+        :param bool compress_requests: Optional, compress request bodies,
+                                       default: False
+        :param request_codec: Optional, one of CODECS used for request
+                              bodies, default: "gzip"
+        :type request_codec: str | unicode
+        :raises ValueError: when request_codec isn't one of CODECS
+        :raises ImportError: when the library of request_codec isn't
+                             installed and compress_requests is enabled
+        :param int level: Optional, compression level of the codec,
+                          default: the default of the codec
+        :param int threshold: Optional, smaller bodies are sent as they are,
+                              default: 4096
+        """
+        if request_codec not in CODECS:
+            raise ValueError('Unknown request codec %s, use one of %s' % (
+                request_codec, ', '.join(sorted(CODECS))))
+        if compress_requests and not CODECS[request_codec][2]():
+            raise ImportError('The library of the %s codec is not installed'
+                              % request_codec)
+        self.accept = tuple(accept)
+        self.compress_requests = compress_requests
+        self.request_codec = request_codec
+        self.level = level
+        self.threshold = threshold
+        self._accept_encoding = dict()
+
+    def __repr__(self):
+        return u'<Compression(accept=%s, requests=%s)>' % (
+            ','.join(self.accept),
+            self.request_codec if self.compress_requests else None)
+
+    def accept_encoding(self, transport):
+        """Returns the Accept-Encoding header value for the transport, or
+        None when it can't decode any accepted coding.
+
+        :param cloudcix.transport.Transport transport: Transport receiving the
+                                                      responses
+        :rtype: unicode
+        """
+        key = transport.__class__
+        if key not in self._accept_encoding:
+            decoders = transport.decoders()
+            codings = [c for c in self.accept if c in decoders]
+            self._accept_encoding[key] = ', '.join(codings) or None
+        return self._accept_encoding[key]
+
+    def encode(self, body):
+        """Compresses a request body when it is worth it.
+
+        :param bytes body: Body of the request
+        :returns: Body to send and the value of its Content-Encoding header
+                  (None if the body isn't compressed)
+        :rtype: (bytes, unicode)
+        """
+        if not self.compress_requests or len(body) < self.threshold:
+            return body, None
+        compress = CODECS[self.request_codec][0]
+        return compress(body, self.level), self.request_codec
+
+
+_default_compression = None
+
+
+def get_default_compression():
+    """Returns the compression settings of the clients without their own,
+    built from the CLOUDCIX_COMPRESSION setting (a dict of Compression
+    arguments, or the same dict as JSON in the environment variable) or,
+    when it isn't set, Compression().
+
+    :rtype: Compression
+    """
+    global _default_compression
+    if _default_compression is None:
+        try:
+            options = getattr(settings, 'CLOUDCIX_COMPRESSION', None)
+        except ImportError:
+            options = os.environ.get('CLOUDCIX_COMPRESSION')
+            options = json.loads(options) if options else None
+        _default_compression = Compression(**(options or {}))
+    return _default_compression
+
+
+def set_default_compression(compression):
+    """Replaces the compression settings of the clients without their own.
+
+    :param Compression compression: New default
+    """
+    global _default_compression
+    _default_compression = compression
@@ -0,0 +1,207 @@
+# python
+from __future__ import unicode_literals
+from array import array
+import logging
+
+# libs
+
+# local
+from . import api
+from .batch import bulk_data, chunked, run_batches
+
+__all__ = ['Plan', 'Reconciler']
+
+_logger = logging.getLogger(__name__)
+
+# Fields of the contacts.group_contact and contacts.campaign_contact services
+CONTACT_FIELD = 'idContact'
+GROUP_FIELD = 'idGroup'
+CAMPAIGN_FIELD = 'idCampaign'
+
+
+def _id_set(ids):
+    """Returns the ids as a sorted array without duplicates, sorting only
+    when they aren't sorted already (eg. as listed by the API).
+
+    :param ids: Iterable of contact ids
+    :rtype: array.array
+    """
+    result = array('L', ids)
+    for i in range(1, len(result)):
+        if result[i - 1] >= result[i]:
+            return array('L', sorted(set(result)))
+    return result
+
+
+def _difference(current, desired):
+    """Merges two sorted id arrays in a single pass.
+
+    :returns: ids to add, ids to remove and the number of ids in both
+    :rtype: (array.array, array.array, int)
+    """
+    adds = array('L')
+    removes = array('L')
+    unchanged = 0
+    i = j = 0
+    while i < len(current) and j < len(desired):
+        if current[i] == desired[j]:
+            unchanged += 1
+            i += 1
+            j += 1
+        elif current[i] < desired[j]:
+            removes.append(current[i])
+            i += 1
+        else:
+            adds.append(desired[j])
+            j += 1
+    removes.extend(current[i:])
+    adds.extend(desired[j:])
+    return adds, removes, unchanged
+
+
+class Plan(object):
+    """Contacts to add to and remove from a group or campaign"""
+
+    def __init__(self, owner, adds, removes, unchanged):
+        self.owner = owner
+        self.adds = adds
+        self.removes = removes
+        self.unchanged = unchanged
+
+    def __len__(self):
+        return len(self.adds) + len(self.removes)
+
+    def __repr__(self):
+        return u'<Plan(%s, %d changes)>' % (self.owner, len(self))
+
+    def report(self):
+        """Returns a one line summary of the plan, eg. for a dry run.
+
+        :rtype: unicode
+        """
+        return '%s: %d unchanged, %d to add, %d to remove' % (
+            self.owner, self.unchanged, len(self.adds), len(self.removes))
+
+
+class Reconciler(object):
+    """Brings the contacts of a contacts.group or contacts.campaign to a
+    desired set of contact ids.
+
+    The current members are streamed into a sorted array of ids (4 to 8
+    bytes per contact) and compared with the desired ids in a single merge
+    pass, so segments of hundreds of thousands of contacts are synced with
+    one bulk create and one bulk delete call per chunk_size contacts, sent
+    concurrently.
+
+    Example::
+
+        reconciler = Reconciler.for_group(idGroup, token=token)
+        plan = reconciler.plan(contact_ids)
+        print(plan.report())
+        errors = reconciler.apply(plan, progress=print)
+    """
+
+    def __init__(self, client, owner_field, owner, token=None,
+                 concurrency=8, chunk_size=500, page_size=1000):
+        """
+        :param cloudcix.base.APIClient client: Service of the contacts of the
+                                               owner, eg.
+                                               api.contacts.group_contact
+        :param owner_field: Name of the owner in the service uri,
+                            eg. "idGroup"
+        :type owner_field: str | unicode
+        :param owner: Primary key of the group or campaign
+        :type owner: str | unicode | int
+        :param token: Optional, Token to be used for the requests.
+        :type token: str | unicode
+        :param int concurrency: Optional, maximum number of concurrent calls,
+                                default: 8
+        :param int chunk_size: Optional, number of contacts per bulk create
+                               and bulk delete call, default: 500
+        :param int page_size: Optional, page size used to stream the current
+                              contacts, default: 1000
+        """
+        self.client = client
+        self.owner_field = owner_field
+        self.owner = owner
+        self.token = token
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.page_size = page_size
+
+    @classmethod
+    def for_group(cls, idGroup, token=None, **kwargs):
+        """Returns a Reconciler of the contacts of a contacts.group"""
+        return cls(api.contacts.group_contact, GROUP_FIELD, idGroup, token,
+                   **kwargs)
+
+    @classmethod
+    def for_campaign(cls, idCampaign, token=None, **kwargs):
+        """Returns a Reconciler of the contacts of a contacts.campaign"""
+        return cls(api.contacts.campaign_contact, CAMPAIGN_FIELD, idCampaign,
+                   token, **kwargs)
+
+    @property
+    def _owner_kwargs(self):
+        return {self.owner_field: self.owner}
+
+    def current(self):
+        """Streams the current contacts of the owner into a sorted array.
+
+        :rtype: array.array
+        """
+        return _id_set(int(data[CONTACT_FIELD])
+                       for data in self.client.iter_list(
+                           self.token, None, self.page_size,
+                           **self._owner_kwargs))
+
+    def plan(self, desired):
+        """Computes the contacts to add and remove.
+
+        :param desired: Iterable of contact ids, eg. read from a file as
+                        strings
+        :returns: Plan
+        """
+        adds, removes, unchanged = _difference(
+            self.current(), _id_set(int(pk) for pk in desired))
+        return Plan('%s %s' % (self.owner_field, self.owner), adds, removes,
+                    unchanged)
+
+    def apply(self, plan, dry_run=False, progress=None):
+        """Applies the plan with bulk create and bulk delete calls of
+        chunk_size contacts, up to concurrency calls at a time.
+
+        :param Plan plan: Plan returned by the plan method
+        :param bool dry_run: Optional, when True nothing is changed and only
+                             the report is logged, default: False
+        :param progress: Optional, callable receiving a BatchResult every time
+                         a batch is done
+        :returns: list of (batch, exception) tuples for the failed batches,
+                  a batch being a list of (action, idContact) tuples
+        :rtype: list
+        """
+        _logger.info(plan.report())
+        if dry_run or not len(plan):
+            return []
+
+        def batches(*actions):
+            for action, ids in actions:
+                for chunk in chunked(ids, self.chunk_size):
+                    yield [(action, pk) for pk in chunk]
+
+        return run_batches(self._apply_batch, batches(
+            ('add', plan.adds), ('remove', plan.removes)),
+            self.concurrency, progress).errors
+
+    def _apply_batch(self, batch):
+        action = batch[0][0]
+        ids = [pk for _, pk in batch]
+        if action == 'add':
+            response = self.client.create(
+                token=self.token,
+                data=bulk_data([{CONTACT_FIELD: pk} for pk in ids]),
+                **self._owner_kwargs)
+        else:
+            response = self.client.bulk_delete(token=self.token, data=ids,
+                                               **self._owner_kwargs)
+        response.raise_for_status()
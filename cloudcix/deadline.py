@@ -0,0 +1,174 @@
+# python
+from __future__ import unicode_literals
+import functools
+import threading
+import time
+
+# libs
+import requests
+
+# local
+
+__all__ = ['Deadline', 'DeadlineExceeded', 'current_deadline', 'remaining',
+           'timeout_for', 'check', 'bind']
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7, the deadline is per thread
+    _local = threading.local()
+
+    def _get():
+        return getattr(_local, 'deadline', None)
+
+    def _set(deadline):
+        token = _get()
+        _local.deadline = deadline
+        return token
+
+    def _reset(token):
+        _local.deadline = token
+else:
+    _current = contextvars.ContextVar('cloudcix_deadline', default=None)
+    _get = _current.get
+    _set = _current.set
+    _reset = _current.reset
+
+
+class DeadlineExceeded(requests.Timeout):
+    """Raised when a call is made, or waits, after the deadline passed"""
+
+
+class Deadline(object):
+    """Time budget shared by every call made within the block, including the
+    pages of iter_list, retries, batches run with run_batches and Keystone
+    authentication. Every call gets the remaining budget as its timeout and
+    no call starts once the budget is spent::
+
+        from cloudcix.deadline import Deadline, DeadlineExceeded
+
+        try:
+            with Deadline(2.5):
+                user = api.membership.user.read(pk=idUser, token=token)
+                address = api.membership.address.read(
+                    pk=user.json()['content']['idAddress'], token=token)
+        except DeadlineExceeded:
+            ...
+
+    Deadlines nest: an inner block can't extend the budget of the outer one.
+    On Python 3.7+ the deadline is kept in a context variable, so it follows
+    asyncio tasks; on older versions it belongs to the thread.
+    """
+
+    def __init__(self, timeout):
+        """
+        :param timeout: Budget in seconds
+        :type timeout: int | float
+        """
+        self.timeout = timeout
+        self.expires = None
+        self._tokens = list()
+
+    def __repr__(self):
+        if self.expires is None:
+            return u'<Deadline(%.3fs, not started)>' % self.timeout
+        return u'<Deadline(%.3fs remaining)>' % self.remaining()
+
+    def __enter__(self):
+        # the budget starts with the block
+        self.expires = time.time() + self.timeout
+        outer = _get()
+        if outer is not None and outer.expires < self.expires:
+            self.expires = outer.expires
+        self._tokens.append(_set(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _reset(self._tokens.pop())
+
+    def remaining(self):
+        """Seconds left, 0 once expired, the whole budget before the block
+        starts.
+        """
+        if self.expires is None:
+            return float(self.timeout)
+        return max(0.0, self.expires - time.time())
+
+    @property
+    def expired(self):
+        return self.expires is not None and time.time() >= self.expires
+
+    def check(self):
+        """:raises DeadlineExceeded: when the deadline passed"""
+        if self.expired:
+            raise DeadlineExceeded('Deadline of %.3fs exceeded' % self.timeout)
+
+    def allows(self, seconds):
+        """Whether there's more than seconds left, eg. to decide if a retry
+        after a back off is worth it.
+
+        :type seconds: int | float
+        :rtype: bool
+        """
+        return self.remaining() > seconds
+
+
+def current_deadline():
+    """Returns the innermost active Deadline or None"""
+    return _get()
+
+
+def remaining():
+    """Returns the seconds left to the current deadline, None without a
+    deadline.
+    """
+    deadline = _get()
+    return None if deadline is None else deadline.remaining()
+
+
+def check():
+    """:raises DeadlineExceeded: when the current deadline passed"""
+    deadline = _get()
+    if deadline is not None:
+        deadline.check()
+
+
+def timeout_for(timeout=None):
+    """Returns the timeout a call should use: the given timeout capped by the
+    remaining budget.
+
+    :param timeout: Optional, timeout requested for the call, in seconds, or
+                    a (connect, read) tuple as with requests, each capped
+    :type timeout: int | float | tuple
+    :raises DeadlineExceeded: when no time is left for the call
+    """
+    deadline = _get()
+    if deadline is None:
+        return timeout
+    # requests and urllib3 reject a timeout of 0, the budget is spent
+    left = deadline.remaining()
+    if left <= 0:
+        raise DeadlineExceeded('Deadline of %.3fs exceeded' %
+                               deadline.timeout)
+    if isinstance(timeout, tuple):
+        return tuple(left if t is None else min(t, left) for t in timeout)
+    if timeout is None:
+        return left
+    return min(timeout, left)
+
+
+def bind(func):
+    """Wraps func so it runs within the deadline current at the time of the
+    wrapping, eg. when func is handed to another thread.
+    """
+    deadline = _get()
+    if deadline is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _set(deadline)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _reset(token)
+    return wrapper
@@ -0,0 +1,510 @@
+# python
+from __future__ import unicode_literals
+import collections
+import logging
+import re
+import socket
+
+# libs
+
+# local
+from . import api
+from .batch import bulk_data, chunked, run_batches
+
+__all__ = ['Plan', 'Reconciler', 'parse_zone', 'reverse_name']
+
+_logger = logging.getLogger(__name__)
+
+# Fields of the dns.record and dns.recordptr services
+RECORD_PK_FIELD = 'idRecord'
+RECORDPTR_PK_FIELD = 'idRecordPTR'
+DOMAIN_FIELD = 'idDomain'
+
+# Record types whose content is a host name
+_NAME_CONTENT_TYPES = ('CNAME', 'DNAME', 'MX', 'NS', 'PTR', 'SRV')
+_ADDRESS_TYPES = ('A', 'AAAA')
+_TOKEN = re.compile(r'"(?:\\.|[^"\\])*"|[()]|;.*|[^\s;()]+')
+_TTL = re.compile(r'^(?:\d+[smhdw]?)+$', re.IGNORECASE)
+_TTL_PART = re.compile(r'(\d+)([smhdw]?)', re.IGNORECASE)
+_TTL_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+_CLASSES = ('IN', 'CH', 'HS', 'CS')
+_RECORD_TYPES = frozenset([
+    'A', 'AAAA', 'AFSDB', 'CAA', 'CERT', 'CNAME', 'DNAME', 'DNSKEY', 'DS',
+    'HINFO', 'HTTPS', 'LOC', 'MX', 'NAPTR', 'NS', 'PTR', 'RP', 'SOA', 'SPF',
+    'SRV', 'SSHFP', 'SVCB', 'TLSA', 'TXT', 'URI'])
+_GENERIC_TYPE = re.compile(r'^TYPE\d+$')
+
+#: Record as compared by the reconciler. Names are lowercase and absolute,
+#: without the trailing dot.
+Record = collections.namedtuple('Record', ['name', 'type', 'content', 'ttl',
+                                           'priority'])
+
+
+def _absolute(name, origin):
+    name = name.lower()
+    if name == '@':
+        return origin
+    if name == '.':
+        return name
+    if name.endswith('.'):
+        return name[:-1]
+    return '%s.%s' % (name, origin) if origin else name
+
+
+def _qualified(name, origin):
+    """Returns the name as written in a zone file: absolute names keep their
+    trailing dot, so they aren't qualified again by _to_record.
+    """
+    absolute = _absolute(name, origin)
+    if absolute == '.' or not (origin or name.endswith('.')):
+        return absolute
+    return absolute + '.'
+
+
+def _parse_ttl(token):
+    """Returns the seconds of a TTL, eg. "3600", "1h" or "1h30m", or None
+    when the token isn't a TTL.
+    """
+    if not _TTL.match(token):
+        return None
+    return sum(int(value) * _TTL_UNITS[unit.lower()]
+               for value, unit in _TTL_PART.findall(token))
+
+
+def _record_name(name, origin):
+    """Like _absolute, for names of records stored by the dns.record
+    service: names already within the origin are absolute, with or without
+    the trailing dot.
+    """
+    lowered = name.lower()
+    if origin and (lowered == origin or lowered.endswith('.' + origin)):
+        return lowered
+    return _absolute(name, origin)
+
+
+def _to_record(data, origin, default_ttl):
+    """Builds a Record from a dict as used by the dns.record service"""
+    rtype = data['type'].upper()
+    content = data['content']
+    if rtype in _NAME_CONTENT_TYPES and content:
+        content = ' '.join(content.split()[:-1] +
+                           [_record_name(content.split()[-1], origin)])
+    priority = data.get('priority')
+    ttl = data.get('ttl')
+    return Record(_record_name(data['name'], origin), rtype, content,
+                  int(default_ttl if ttl in (None, '') else ttl),
+                  int(priority) if priority not in (None, '') else None)
+
+
+def parse_zone(text, origin=None, default_ttl=3600):
+    """Parses a zone file into a list of record dicts.
+
+    Supports $ORIGIN and $TTL, "@", relative names, omitted owners, TTL
+    (in seconds or with BIND units, eg. "1h30m") and class fields in any
+    order, parentheses spanning lines and comments. The priority of MX and
+    SRV records is returned in its own field. Absolute names are returned
+    with their trailing dot.
+
+    :param text: Contents of the zone file
+    :type text: str | unicode
+    :param origin: Optional, origin of the zone when the file has no $ORIGIN
+    :type origin: str | unicode
+    :param int default_ttl: Optional, TTL used when the file doesn't specify
+                            one, default: 3600
+    :returns: list of dicts with the name, type, content, ttl and priority
+              keys
+    :rtype: list
+    :raises ValueError: for directives other than $ORIGIN and $TTL, unknown
+                        record types and incomplete records
+    """
+    origin = origin.lower().rstrip('.') if origin else None
+    records = list()
+    owner = None
+    line_tokens = list()
+    depth = 0
+    lines = list()
+    for number, line in enumerate(text.splitlines(), 1):
+        starts_blank = bool(line) and line[0] in ' \t'
+        tokens = [t for t in _TOKEN.findall(line) if not t.startswith(';')]
+        if depth == 0:
+            line_tokens = list()
+            lines.append((number, starts_blank, line_tokens))
+        for token in tokens:
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+            else:
+                line_tokens.append(token)
+
+    for number, starts_blank, tokens in lines:
+        if not tokens:
+            continue
+        directive = tokens[0].upper()
+        if directive == '$ORIGIN':
+            origin = tokens[1].lower().rstrip('.')
+            continue
+        if directive == '$TTL':
+            default_ttl = _parse_ttl(tokens[1])
+            if default_ttl is None:
+                raise ValueError('Line %d: invalid $TTL %s' % (number,
+                                                               tokens[1]))
+            continue
+        if directive.startswith('$'):
+            raise ValueError('Line %d: unsupported directive %s' % (
+                number, tokens[0]))
+        if not starts_blank:
+            owner = _qualified(tokens.pop(0), origin)
+        ttl = None
+        while tokens and (_parse_ttl(tokens[0]) is not None or
+                          tokens[0].upper() in _CLASSES):
+            token = tokens.pop(0)
+            if token.upper() not in _CLASSES:
+                ttl = _parse_ttl(token)
+        rtype = tokens.pop(0).upper() if tokens else None
+        if rtype not in _RECORD_TYPES and not _GENERIC_TYPE.match(
+                rtype or ''):
+            raise ValueError('Line %d: unknown record type %s' % (number,
+                                                                  rtype))
+        priority = None
+        if rtype in ('MX', 'SRV') and tokens:
+            priority = int(tokens.pop(0))
+        if not tokens:
+            raise ValueError('Line %d: %s record without content' % (
+                number, rtype))
+        if rtype in _NAME_CONTENT_TYPES:
+            tokens[-1] = _qualified(tokens[-1], origin)
+        records.append({
+            'name': owner,
+            'type': rtype,
+            'content': ' '.join(tokens),
+            'ttl': default_ttl if ttl is None else ttl,
+            'priority': priority,
+        })
+    return records
+
+
+def reverse_name(address):
+    """Returns the name of the PTR record for an IPv4 or IPv6 address,
+    eg. "4.3.2.1.in-addr.arpa" for "1.2.3.4".
+
+    :type address: str | unicode
+    :rtype: unicode
+    """
+    if ':' in address:
+        packed = socket.inet_pton(socket.AF_INET6, address)
+        nibbles = ''.join('%02x' % b for b in bytearray(packed))
+        return '.'.join(reversed(nibbles)) + '.ip6.arpa'
+    return '.'.join(reversed(address.split('.'))) + '.in-addr.arpa'
+
+
+class Plan(object):
+    """Minimal set of changes bringing a domain to its desired state"""
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.unchanged = 0
+        self.creates = list()
+        self.updates = list()
+        self.deletes = list()
+        self.ptr_sets = list()
+        self.ptr_deletes = list()
+
+    def __len__(self):
+        return len(self.creates) + len(self.updates) + len(self.deletes) + \
+            len(self.ptr_sets) + len(self.ptr_deletes)
+
+    def __repr__(self):
+        return u'<Plan(domain=%s, %d changes)>' % (self.domain, len(self))
+
+    def report(self):
+        """Returns a human readable description of the plan, eg. for a dry
+        run.
+
+        :rtype: unicode
+        """
+        lines = ['Domain %s: %d unchanged, %d to create, %d to update, '
+                 '%d to delete, %d PTR to set, %d PTR to delete' % (
+                     self.domain, self.unchanged, len(self.creates),
+                     len(self.updates), len(self.deletes),
+                     len(self.ptr_sets), len(self.ptr_deletes))]
+        for record in self.creates:
+            lines.append('+ %s' % self._format(record))
+        for pk, old, new in self.updates:
+            lines.append('~ %s -> %s' % (self._format(old),
+                                         self._format(new)))
+        for pk, record in self.deletes:
+            lines.append('- %s' % self._format(record))
+        for address, name in self.ptr_sets:
+            lines.append('+ PTR %s -> %s' % (reverse_name(address), name))
+        for address, name in self.ptr_deletes:
+            lines.append('- PTR %s -> %s' % (reverse_name(address), name))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _format(record):
+        priority = '' if record.priority is None else ' %d' % record.priority
+        return '%s %d %s%s %s' % (record.name, record.ttl, record.type,
+                                  priority, record.content)
+
+
+class Reconciler(object):
+    """Brings the records of a dns.domain to a desired state with the
+    minimal number of calls.
+
+    The desired records are indexed by (name, type, content) and the current
+    records are streamed from dns.record against that index. Exact matches
+    are left alone or updated when their TTL or priority differ, the
+    remaining desired records replace current records of the same name and
+    type with an update, and only what's left after that is created or
+    deleted. PTR records of created,
+    changed and deleted A/AAAA records are kept in line through
+    dns.recordptr.
+
+    Example::
+
+        reconciler = Reconciler(idDomain, token=token)
+        with open('example.com.zone') as f:
+            plan = reconciler.plan(parse_zone(f.read(), 'example.com'))
+        print(plan.report())
+        errors = reconciler.apply(plan)
+    """
+
+    def __init__(self, domain, token=None, origin=None, default_ttl=3600,
+                 ignore_types=('SOA',), ptr=True, concurrency=8,
+                 chunk_size=100, page_size=500):
+        """
+        :param domain: Primary key of the dns.domain
+        :type domain: str | unicode | int
+        :param token: Optional, Token to be used for the requests.
+        :type token: str | unicode
+        :param origin: Optional, origin used for relative names in the
+                       desired records
+        :type origin: str | unicode
+        :param int default_ttl: Optional, TTL of desired records without one,
+                                default: 3600
+        :param tuple ignore_types: Optional, record types left untouched,
+                                   default: ('SOA',)
+        :param bool ptr: Optional, whether PTR records of A/AAAA records are
+                         maintained, default: True
+        :param int concurrency: Optional, maximum number of concurrent calls,
+                                default: 8
+        :param int chunk_size: Optional, number of records per bulk create
+                               and bulk delete call, default: 100
+        :param int page_size: Optional, page size used to stream the current
+                              records, default: 500
+        """
+        self.domain = domain
+        self.token = token
+        self.origin = origin.lower().rstrip('.') if origin else None
+        self.default_ttl = default_ttl
+        self.ignore_types = set(t.upper() for t in ignore_types)
+        self.ptr = ptr
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.page_size = page_size
+
+    def current(self):
+        """Streams the current records of the domain.
+
+        :returns: Generator yielding (pk, Record) tuples
+        """
+        params = {DOMAIN_FIELD: self.domain}
+        for data in api.dns.record.iter_list(self.token, params,
+                                             self.page_size):
+            record = _to_record(data, self.origin, self.default_ttl)
+            if record.type not in self.ignore_types:
+                yield data[RECORD_PK_FIELD], record
+
+    def plan(self, desired):
+        """Computes the changes needed to reach the desired state.
+
+        :param desired: Iterable of record dicts (name, type, content and
+                        optionally ttl and priority), eg. as returned by
+                        parse_zone
+        :returns: Plan
+        """
+        plan = Plan(self.domain)
+        wanted = collections.defaultdict(list)
+        for data in desired:
+            record = _to_record(data, self.origin, self.default_ttl)
+            if record.type not in self.ignore_types:
+                wanted[record[:3]].append(record)
+
+        # current records without an exact match, by (name, type)
+        leftover = collections.defaultdict(list)
+        for pk, record in self.current():
+            matches = wanted.get(record[:3])
+            if not matches:
+                leftover[record[:2]].append((pk, record))
+                continue
+            new = matches.pop()
+            if not matches:
+                del wanted[record[:3]]
+            if new[3:] == record[3:]:
+                plan.unchanged += 1
+            else:
+                plan.updates.append((pk, record, new))
+
+        missing = collections.defaultdict(list)
+        for records in wanted.values():
+            for record in records:
+                missing[record[:2]].append(record)
+        for name_type, records in missing.items():
+            replaced = leftover.pop(name_type, [])
+            for (pk, old), new in zip(replaced, records):
+                plan.updates.append((pk, old, new))
+            plan.creates.extend(records[len(replaced):])
+            plan.deletes.extend(replaced[len(records):])
+        for records in leftover.values():
+            plan.deletes.extend(records)
+
+        if self.ptr:
+            self._plan_ptr(plan)
+        return plan
+
+    def apply(self, plan, dry_run=False, progress=None):
+        """Applies the plan.
+
+        Creates and deletes are sent in bulk calls of chunk_size records,
+        updates and PTR changes one record per call, with up to concurrency
+        calls at a time. Deletes are done before updates and updates before
+        creates, so a record can replace another one of a different type
+        with the same name. PTR changes are applied once the records are
+        done, except those of records that failed.
+
+        :param Plan plan: Plan returned by the plan method
+        :param bool dry_run: Optional, when True nothing is changed and only
+                             the report is logged, default: False
+        :param progress: Optional, callable receiving a BatchResult every time
+                         a batch is done
+        :returns: list of (batch, exception) tuples for the failed batches
+        :rtype: list
+        """
+        _logger.info(plan.report())
+        if dry_run or not len(plan):
+            return []
+
+        def batches(action, items):
+            for chunk in chunked(items, self.chunk_size):
+                yield [(action, item) for item in chunk]
+
+        errors = list()
+        for action, items in (('delete', plan.deletes),
+                              ('update', plan.updates),
+                              ('create', plan.creates)):
+            result = run_batches(self._apply_batch, batches(action, items),
+                                 self.concurrency, progress)
+            errors += result.errors
+            if not result.complete:
+                return errors
+
+        failed = self._failed_addresses(errors)
+        for action, items in (('ptr_set', plan.ptr_sets),
+                              ('ptr_delete', plan.ptr_deletes)):
+            items = [item for item in items if item[0] not in failed]
+            result = run_batches(self._apply_batch, batches(action, items),
+                                 self.concurrency, progress)
+            errors += result.errors
+            if not result.complete:
+                break
+        return errors
+
+    @staticmethod
+    def _failed_addresses(errors):
+        """Returns the addresses of the A/AAAA records of failed batches"""
+        addresses = set()
+        for batch, _ in errors:
+            for action, item in batch:
+                if action == 'update':
+                    records = item[1:]
+                elif action == 'delete':
+                    records = [item[1]]
+                else:
+                    records = [item]
+                addresses.update(r.content for r in records
+                                 if r.type in _ADDRESS_TYPES)
+        return addresses
+
+    def _plan_ptr(self, plan):
+        sets = dict()
+        deletes = dict()
+        for record in plan.creates:
+            if record.type in _ADDRESS_TYPES:
+                sets[record.content] = record.name
+        for pk, old, new in plan.updates:
+            if new.type in _ADDRESS_TYPES and old[:3] != new[:3]:
+                deletes[old.content] = old.name
+                sets[new.content] = new.name
+        for pk, record in plan.deletes:
+            if record.type in _ADDRESS_TYPES:
+                deletes[record.content] = record.name
+        # an address moved to another name is overwritten, not deleted
+        for address in sets:
+            deletes.pop(address, None)
+        plan.ptr_sets = sorted(sets.items())
+        plan.ptr_deletes = sorted(deletes.items())
+
+    def _record_data(self, record):
+        data = dict(record._asdict())
+        data[DOMAIN_FIELD] = self.domain
+        # targets may be outside the zone, store them fully qualified
+        if record.type in _NAME_CONTENT_TYPES and record.content != '.':
+            data['content'] += '.'
+        if data['priority'] is None:
+            del data['priority']
+        return data
+
+    def _apply_batch(self, batch):
+        action = batch[0][0]
+        items = [item for _, item in batch]
+        if action in ('create', 'delete'):
+            getattr(self, '_%s' % action)(items)
+        else:
+            for item in items:
+                getattr(self, '_%s' % action)(item)
+
+    def _create(self, records):
+        data = [self._record_data(r) for r in records]
+        api.dns.record.create(token=self.token,
+                              data=bulk_data(data)).raise_for_status()
+
+    def _delete(self, records):
+        api.dns.record.bulk_delete(
+            token=self.token,
+            data=[pk for pk, _ in records]).raise_for_status()
+
+    def _update(self, update):
+        pk, old, new = update
+        api.dns.record.update(pk, token=self.token,
+                              data=self._record_data(new)).raise_for_status()
+
+    def _ptr_records(self, address):
+        params = {'name': reverse_name(address)}
+        response = api.dns.recordptr.list(token=self.token, params=params)
+        response.raise_for_status()
+        return response.json()['content']
+
+    def _ptr_set(self, change):
+        address, name = change
+        # like the targets of _record_data, fully qualified: a bare name would
+        # be relative to the reverse zone
+        data = {'name': reverse_name(address), 'type': 'PTR',
+                'content': name + '.'}
+        existing = self._ptr_records(address)
+        if existing:
+            if existing[0]['content'].rstrip('.').lower() == name:
+                return
+            response = api.dns.recordptr.update(
+                existing[0][RECORDPTR_PK_FIELD], token=self.token, data=data)
+        else:
+            response = api.dns.recordptr.create(token=self.token, data=data)
+        response.raise_for_status()
+
+    def _ptr_delete(self, change):
+        address, name = change
+        for ptr in self._ptr_records(address):
+            # leave alone PTR records pointing somewhere else
+            if ptr['content'].rstrip('.').lower() == name:
+                api.dns.recordptr.delete(ptr[RECORDPTR_PK_FIELD],
+                                         token=self.token).raise_for_status()
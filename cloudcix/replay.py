@@ -0,0 +1,370 @@
+# python
+from __future__ import unicode_literals
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+try:
+    from urllib.parse import parse_qsl, urlparse
+except ImportError:  # Python 2
+    from urlparse import parse_qsl, urlparse
+
+# libs
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# local
+from .transport import Response, Transport, get_default_transport
+
+__all__ = ['Recorder', 'Player', 'RecordingTransport', 'ReplayTransport',
+           'RecordingAdapter', 'ReplayAdapter', 'ReplayMiss']
+
+# The content is stored decoded, the headers describing the encoding of the
+# original body no longer apply
+_SKIPPED_HEADERS = frozenset(['content-encoding', 'content-length',
+                              'transfer-encoding', 'connection', 'keep-alive',
+                              'set-cookie'])
+
+
+class ReplayMiss(requests.ConnectionError):
+    """Raised when no recorded exchange matches a request"""
+
+
+def _key(method, template, uri, params):
+    """Returns the key exchanges are matched on: the method, the uri
+    template (the path of the uri when the caller has no template) and the
+    query params, in a canonical order.
+    """
+    parsed = urlparse(uri)
+    if template is None:
+        template = parsed.path.lstrip('/')
+    pairs = parse_qsl(parsed.query, keep_blank_values=True)
+    for k, v in sorted((params or {}).items()):
+        for value in v if isinstance(v, (list, tuple)) else [v]:
+            pairs.append((k, value))
+    pairs = sorted(('%s' % k, '%s' % v) for k, v in pairs)
+    return method.upper(), template, json.dumps(pairs)
+
+
+class Recorder(object):
+    """Records the exchanges of the API clients and of Keystone to a gzip
+    compressed NDJSON file, to be replayed by a Player.
+
+    Every exchange is stored with its method, uri template, query params,
+    status, response headers and latency; identical response bodies are
+    stored once. Request headers and bodies are not recorded, but the
+    responses are: Keystone responses contain tokens, keep recordings of
+    production accordingly::
+
+        from cloudcix import replay, transport, utils
+
+        with replay.Recorder('calls.ndjson.gz') as recorder:
+            transport.set_default_transport(recorder.transport)
+            session = utils.get_admin_session(session=recorder.session())
+            ...
+
+    Once the recorder is closed, its transport and sessions keep sending
+    the requests without recording them. Record in a single process, a
+    forked process must not write to the recording of its parent.
+    """
+
+    def __init__(self, path, transport=None):
+        """
+        :param path: Path of the recording, overwritten
+        :type path: str | unicode
+        :param cloudcix.transport.Transport transport: Optional, transport
+                                                       sending the requests,
+                                                       default: the default
+                                                       transport
+        """
+        self.path = path
+        self.transport = RecordingTransport(
+            self, transport or get_default_transport())
+        self.exchanges = 0
+        self.closed = False
+        self._file = gzip.open(path, 'wb')
+        self._bodies = dict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return u'<Recorder(%s, %d exchanges)>' % (self.path, self.exchanges)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def session(self):
+        """Returns a requests.Session recording its exchanges, eg. for the
+        session of a KeystoneSession.
+
+        :rtype: requests.Session
+        """
+        session = requests.Session()
+        adapter = RecordingAdapter(self)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def record(self, method, template, uri, params, started, response):
+        """Adds an exchange to the recording, unless the recorder is closed.
+
+        :param float started: Time the request was sent at
+        :param response: requests.Response or
+                         cloudcix.transport.Response, with its content read
+        """
+        if self.closed:
+            return
+        latency = time.time() - started
+        content = response.content or b''
+        headers = dict((k, v) for k, v in response.headers.items()
+                       if k.lower() not in _SKIPPED_HEADERS)
+        digest = hashlib.md5(content).hexdigest()
+        method, template, params = _key(method, template, uri, params)
+        with self._lock:
+            if self.closed:
+                return
+            if digest not in self._bodies:
+                self._bodies[digest] = len(self._bodies)
+                try:
+                    body = {'text': content.decode('utf-8')}
+                except UnicodeDecodeError:
+                    body = {'base64': base64.b64encode(content).decode(
+                        'ascii')}
+                body['body'] = self._bodies[digest]
+                self._write(body)
+            self._write({
+                'method': method,
+                'template': template,
+                'params': params,
+                'uri': uri,
+                'status': response.status_code,
+                'headers': headers,
+                'body': self._bodies[digest],
+                'latency': round(latency, 6),
+            })
+            self.exchanges += 1
+
+    def _write(self, line):
+        self._file.write(json.dumps(line).encode('utf-8') + b'\n')
+
+    def close(self):
+        """Closes the recording"""
+        with self._lock:
+            self.closed = True
+            self._file.close()
+
+
+class _Exchange(object):
+    __slots__ = ('uri', 'status', 'headers', 'body', 'latency')
+
+    def __init__(self, uri, status, headers, body, latency):
+        self.uri = uri
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.latency = latency
+
+
+class Player(object):
+    """Replays a recording made by a Recorder, without any network.
+
+    The recording is loaded in memory, indexed by method, uri template and
+    query params, which is what requests are matched on.
+    Exchanges recorded for the same request are replayed in the order they
+    were recorded, starting over after the last one, so a short recording
+    can feed a long load test.
+
+    Each response is returned after its recorded latency divided by speed:
+    1 replays at recorded speed, 2 twice as fast and None as fast as
+    possible. A latency longer than the timeout of the call raises
+    requests.Timeout, after waiting for the timeout::
+
+        from cloudcix import replay, transport, utils
+
+        player = replay.Player('calls.ndjson.gz', speed=None)
+        transport.set_default_transport(player.transport)
+        session = utils.get_admin_session(session=player.session())
+    """
+
+    def __init__(self, path, speed=1.0, strict=True):
+        """
+        :param path: Path of the recording
+        :type path: str | unicode
+        :param speed: Optional, factor applied to the recorded latencies,
+                      None to replay without waiting, default: 1.0
+        :type speed: int | float
+        :param bool strict: Optional, when no exchange matches the params
+                            of a request, raise ReplayMiss (True) or use the
+                            exchanges of the same method and template
+                            (False), default: True
+        """
+        self.path = path
+        self.speed = speed
+        self.strict = strict
+        self.transport = ReplayTransport(self)
+        self._index = dict()
+        self._loose_index = dict()
+        self._cursors = dict()
+        self._lock = threading.Lock()
+        self._load()
+
+    def __repr__(self):
+        return u'<Player(%s, %d requests)>' % (self.path, len(self._index))
+
+    def _load(self):
+        bodies = dict()
+        with gzip.open(self.path, 'rb') as f:
+            for line in f:
+                line = json.loads(line.decode('utf-8'))
+                if 'method' not in line:
+                    if 'text' in line:
+                        content = line['text'].encode('utf-8')
+                    else:
+                        content = base64.b64decode(line['base64'])
+                    bodies[line['body']] = content
+                    continue
+                exchange = _Exchange(line['uri'], line['status'],
+                                     line['headers'], bodies[line['body']],
+                                     line['latency'])
+                key = line['method'], line['template'], line['params']
+                self._index.setdefault(key, list()).append(exchange)
+                self._loose_index.setdefault(key[:2], list()).append(exchange)
+
+    def session(self):
+        """Returns a requests.Session answering from the recording, eg. for
+        the session of a KeystoneSession.
+
+        :rtype: requests.Session
+        """
+        session = requests.Session()
+        adapter = ReplayAdapter(self)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def play(self, method, template, uri, params=None, timeout=None):
+        """Returns the next recorded exchange matching the request, after its
+        latency.
+
+        :raises ReplayMiss: when no exchange matches the request
+        :raises requests.Timeout: when the latency is longer than timeout
+        """
+        key = _key(method, template, uri, params)
+        exchanges = self._index.get(key)
+        if exchanges is None and not self.strict:
+            key = key[:2]
+            exchanges = self._loose_index.get(key)
+        if exchanges is None:
+            raise ReplayMiss('No recorded exchange for %s %s' % (method, uri))
+        with self._lock:
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+        exchange = exchanges[cursor % len(exchanges)]
+        if self.speed:
+            delay = exchange.latency / self.speed
+            if isinstance(timeout, tuple):  # (connect, read) of requests
+                timeout = timeout[-1]
+            if timeout is not None and delay > timeout:
+                time.sleep(timeout)
+                raise requests.Timeout('Replayed response took %.3fs' % delay)
+            time.sleep(delay)
+        return exchange
+
+    def reset(self):
+        """Starts replaying every request from its first exchange again"""
+        with self._lock:
+            self._cursors.clear()
+
+
+class RecordingTransport(Transport):
+    """Transport recording the exchanges of another transport, see
+    Recorder.
+    """
+    name = 'recording'
+    templates = True
+
+    def __init__(self, recorder, transport):
+        self.recorder = recorder
+        self.inner = transport
+
+    def request(self, method, uri, headers, data=None, params=None,
+                timeout=None, template=None, **kwargs):
+        started = time.time()
+        response = self.inner.request(method, uri, headers, data=data,
+                                      params=params, timeout=timeout,
+                                      **kwargs)
+        self.recorder.record(method, template, uri, params, started,
+                             response)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+    def decoders(self):
+        return self.inner.decoders()
+
+    def connect(self, uri, count=1):
+        self.inner.connect(uri, count)
+
+
+class ReplayTransport(Transport):
+    """Transport answering from a recording, see Player"""
+    name = 'replay'
+    templates = True
+
+    def __init__(self, player):
+        self.player = player
+
+    def request(self, method, uri, headers, data=None, params=None,
+                timeout=None, template=None, **kwargs):
+        exchange = self.player.play(method, template, uri, params, timeout)
+        return Response(exchange.status, CaseInsensitiveDict(exchange.headers),
+                        exchange.body, exchange.uri)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """requests adapter recording the exchanges of a requests.Session"""
+
+    def __init__(self, recorder, **kwargs):
+        super(RecordingAdapter, self).__init__(**kwargs)
+        self.recorder = recorder
+
+    def send(self, request, **kwargs):
+        started = time.time()
+        response = super(RecordingAdapter, self).send(request, **kwargs)
+        if not kwargs.get('stream'):
+            self.recorder.record(request.method, None, request.url, None,
+                                 started, response)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """requests adapter answering from a recording"""
+
+    def __init__(self, player):
+        super(ReplayAdapter, self).__init__()
+        self.player = player
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        exchange = self.player.play(request.method, None, request.url,
+                                    timeout=timeout)
+        response = requests.Response()
+        response.status_code = exchange.status
+        response.headers = CaseInsensitiveDict(exchange.headers)
+        response._content = exchange.body
+        response._content_consumed = True
+        response.encoding = requests.utils.get_encoding_from_headers(
+            response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,255 @@
+# python
+from __future__ import unicode_literals
+import collections
+import contextlib
+import threading
+import time
+import weakref
+
+# libs
+import requests
+
+# local
+from .utils import register_after_fork
+
+__all__ = ['Scheduler', 'QueueTimeout', 'INTERACTIVE', 'BATCH', 'priority',
+           'current_priority', 'get_default_scheduler',
+           'set_default_scheduler']
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+_local = threading.local()
+_schedulers = weakref.WeakSet()
+
+
+class QueueTimeout(requests.Timeout):
+    """Raised when a call waited too long for a free slot"""
+
+
+class _Ticket(object):
+    __slots__ = ('event', 'queued', 'granted')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.queued = time.time()
+        self.granted = False
+
+
+class _Lane(object):
+
+    def __init__(self, name, weight=1, reserved=0):
+        self.name = name
+        self.weight = float(weight)
+        self.reserved = reserved
+        self.waiting = collections.deque()
+        self.active = 0
+        self.pass_value = 0.0
+        self.calls = 0
+        self.max_waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def stats(self):
+        return {
+            'active': self.active,
+            'waiting': len(self.waiting),
+            'max_waiting': self.max_waiting,
+            'calls': self.calls,
+            'wait_total': self.wait_total,
+            'wait_max': self.wait_max,
+            'wait_avg': self.wait_total / self.calls if self.calls else 0.0,
+        }
+
+
+class Scheduler(object):
+    """Limits the number of concurrent API calls and shares them between
+    priority lanes.
+
+    Every lane can always use its reserved slots, whatever the other lanes
+    do. The remaining slots are shared: when calls of several lanes wait for
+    them, the lanes are served in proportion to their weight (stride
+    scheduling), calls of the same lane in order of arrival.
+
+    By default the "interactive" lane has 2 reserved slots and weight 4 and
+    the "batch" lane has weight 1, so background syncs can't take the slots
+    of user facing calls::
+
+        from cloudcix import scheduler
+
+        scheduler.set_default_scheduler(scheduler.Scheduler(capacity=10))
+
+        with scheduler.priority(scheduler.BATCH):
+            for record in api.dns.record.iter_list(token=token):
+                ...
+    """
+
+    def __init__(self, capacity=10, lanes=None, default_lane=INTERACTIVE):
+        """
+        :param int capacity: Optional, maximum number of concurrent calls,
+                             default: 10
+        :param dict lanes: Optional, lane names mapped to dicts with their
+                           weight and reserved slots,
+                           default: {'interactive': {'weight': 4,
+                                                     'reserved': 2},
+                                     'batch': {'weight': 1}}
+        :param default_lane: Optional, lane of calls made without a priority,
+                             default: "interactive"
+        :type default_lane: str | unicode
+        """
+        if lanes is None:
+            lanes = {INTERACTIVE: {'weight': 4, 'reserved': 2},
+                     BATCH: {'weight': 1}}
+        self.capacity = capacity
+        self.default_lane = default_lane
+        self._lanes = dict((name, _Lane(name, **options))
+                           for name, options in lanes.items())
+        self._shared = capacity - sum(lane.reserved
+                                      for lane in self._lanes.values())
+        if self._shared < 0:
+            raise ValueError('More slots reserved than the capacity')
+        self._lock = threading.Lock()
+        self._virtual_time = 0.0
+        _schedulers.add(self)
+
+    def __repr__(self):
+        return u'<Scheduler(capacity=%d, lanes=%s)>' % (
+            self.capacity, ', '.join(sorted(self._lanes)))
+
+    def acquire(self, lane=None, timeout=None):
+        """Waits for a free slot.
+
+        :param lane: Optional, name of the lane, default: default_lane
+        :type lane: str | unicode
+        :param timeout: Optional, maximum number of seconds to wait
+        :type timeout: int | float
+        :raises QueueTimeout: when no slot was free within the timeout
+        """
+        lane = self._lanes[lane or self.default_lane]
+        ticket = _Ticket()
+        with self._lock:
+            if not lane.waiting:
+                # an idle lane doesn't get credit for the time it was idle
+                lane.pass_value = max(lane.pass_value, self._virtual_time)
+            lane.waiting.append(ticket)
+            lane.max_waiting = max(lane.max_waiting, len(lane.waiting))
+            self._dispatch()
+        if ticket.event.wait(timeout):
+            return
+        with self._lock:
+            if ticket.granted:
+                return
+            lane.waiting.remove(ticket)
+        raise QueueTimeout('No free slot in the %s lane within %.3fs' % (
+            lane.name, timeout))
+
+    def release(self, lane=None):
+        """Frees a slot taken with acquire.
+
+        :param lane: Optional, name of the lane, default: default_lane
+        :type lane: str | unicode
+        """
+        lane = self._lanes[lane or self.default_lane]
+        with self._lock:
+            lane.active -= 1
+            self._dispatch()
+
+    @contextlib.contextmanager
+    def slot(self, lane=None, timeout=None):
+        """Context manager holding a slot for the duration of the block."""
+        self.acquire(lane, timeout)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def stats(self):
+        """Returns the metrics of every lane: active calls, queue depth
+        (current and maximum), number of calls and time spent waiting
+        (total, maximum and average, in seconds).
+
+        :rtype: dict
+        """
+        with self._lock:
+            return dict((name, lane.stats())
+                        for name, lane in self._lanes.items())
+
+    def _can_start(self, lane):
+        lanes = self._lanes.values()
+        if sum(l.active for l in lanes) >= self.capacity:
+            return False
+        if lane.active < lane.reserved:
+            return True
+        shared_used = sum(max(0, l.active - l.reserved) for l in lanes)
+        return shared_used < self._shared
+
+    def _dispatch(self):
+        while True:
+            ready = [l for l in self._lanes.values()
+                     if l.waiting and self._can_start(l)]
+            if not ready:
+                return
+            lane = min(ready, key=lambda l: l.pass_value)
+            ticket = lane.waiting.popleft()
+            waited = time.time() - ticket.queued
+            lane.active += 1
+            lane.calls += 1
+            lane.wait_total += waited
+            lane.wait_max = max(lane.wait_max, waited)
+            self._virtual_time = lane.pass_value
+            lane.pass_value += 1 / lane.weight
+            ticket.granted = True
+            ticket.event.set()
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        for lane in self._lanes.values():
+            lane.waiting.clear()
+            lane.active = 0
+
+
+@contextlib.contextmanager
+def priority(lane):
+    """Runs the calls made by the current thread within the block in the
+    lane, eg. with priority(BATCH).
+
+    :type lane: str | unicode
+    """
+    previous = current_priority()
+    _local.lane = lane
+    try:
+        yield
+    finally:
+        _local.lane = previous
+
+
+def current_priority():
+    """Returns the lane set with priority for the current thread, or None"""
+    return getattr(_local, 'lane', None)
+
+
+_default_scheduler = None
+
+
+def get_default_scheduler():
+    """Returns the scheduler used by the API clients, None (the default)
+    when the calls aren't scheduled.
+
+    :rtype: Scheduler
+    """
+    return _default_scheduler
+
+
+def set_default_scheduler(scheduler):
+    """Sets the scheduler used by the API clients.
+
+    :param Scheduler scheduler: New scheduler, or None to stop scheduling
+    """
+    global _default_scheduler
+    _default_scheduler = scheduler
+
+
+@register_after_fork
+def _reset_schedulers():
+    for scheduler in list(_schedulers):
+        scheduler._after_fork()
@@ -0,0 +1,340 @@
+# python
+from __future__ import unicode_literals
+import calendar
+import collections
+import datetime
+import logging
+import threading
+import time
+import weakref
+
+# libs
+from keystoneclient import access
+
+# local
+from . import deadline
+from .utils import get_admin_client, get_cached_admin_session, \
+    get_required_settings, register_after_fork, reset_keystone_session
+
+__all__ = ['TokenCache']
+
+_logger = logging.getLogger(__name__)
+
+REVOCATION_EVENTS_PATH = '/OS-REVOKE/events'
+TOKENS_PATH = '/auth/tokens'
+
+_caches = weakref.WeakSet()
+
+
+def _to_utc(value):
+    """Converts a datetime (naive UTC or timezone aware) into naive UTC."""
+    if value is None:
+        return None
+    offset = value.utcoffset()
+    if offset is not None:
+        value = value.replace(tzinfo=None) - offset
+    return value
+
+
+def _parse_isotime(value):
+    """Parses the ISO 8601 timestamps returned by Keystone into naive UTC
+    datetimes, eg. "2015-03-05T10:02:03.000000Z".
+    """
+    if not value:
+        return None
+    value = value.rstrip('Z')
+    for fmt in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(value[:26], fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class _Pending(object):
+    """Validation in flight, shared by every thread asking for the same
+    token.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.auth_ref = None
+        self.error = None
+
+
+class _Entry(object):
+    __slots__ = ('auth_ref', 'expires_at', 'issued', 'user_id', 'project_id',
+                 'domain_ids', 'role_ids', 'audit_ids')
+
+    def __init__(self, auth_ref):
+        self.auth_ref = auth_ref
+        expires = _to_utc(auth_ref.expires)
+        self.expires_at = calendar.timegm(expires.utctimetuple())
+        self.issued = _to_utc(auth_ref.issued)
+        self.user_id = auth_ref.user_id
+        self.project_id = auth_ref.project_id
+        self.domain_ids = set(filter(None, [
+            getattr(auth_ref, 'user_domain_id', None),
+            getattr(auth_ref, 'project_domain_id', None),
+            getattr(auth_ref, 'domain_id', None)]))
+        self.role_ids = set(getattr(auth_ref, 'role_ids', None) or [])
+        self.audit_ids = list(auth_ref.get('audit_ids') or [])
+
+    def revoked_by(self, event):
+        """Checks whether a Keystone revocation event applies to this token.
+
+        Every attribute present on the event has to match the token. Fields
+        this client can't compare are ignored, which can only make the match
+        broader; a wrongly dropped entry costs one extra validation.
+        """
+        if 'audit_id' in event and event['audit_id'] not in self.audit_ids:
+            return False
+        if 'audit_chain_id' in event and \
+                event['audit_chain_id'] not in self.audit_ids[-1:]:
+            return False
+        if 'user_id' in event and event['user_id'] != self.user_id:
+            return False
+        if 'project_id' in event and event['project_id'] != self.project_id:
+            return False
+        if 'domain_id' in event and event['domain_id'] not in self.domain_ids:
+            return False
+        if 'role_id' in event and event['role_id'] not in self.role_ids:
+            return False
+        issued_before = _parse_isotime(event.get('issued_before'))
+        if issued_before and self.issued and self.issued > issued_before:
+            return False
+        return True
+
+
+class TokenCache(object):
+    """Caches the results of Keystone token validation.
+
+    Validated tokens are kept as ``AccessInfoV3`` objects until they expire,
+    in a LRU bounded by ``max_size``. Keystone revocation events are polled
+    incrementally (at most once every ``poll_interval`` seconds, from the
+    thread that validates a token) and every matching entry is dropped. When
+    several threads validate the same token at once, only one of them calls
+    Keystone and the others wait for its result.
+
+    Example::
+
+        from cloudcix.tokencache import TokenCache
+        from keystoneclient.exceptions import NotFound
+
+        token_cache = TokenCache()
+
+        try:
+            auth_ref = token_cache.validate(user_token)
+        except NotFound:
+            # token is not valid
+            ...
+    """
+
+    def __init__(self, max_size=10000, poll_interval=10, stale_duration=30,
+                 client=None, poll_timeout=5):
+        """
+        :param int max_size: Optional, maximum number of cached tokens,
+                             default: 10000
+        :param poll_interval: Optional, seconds between two polls of the
+                              Keystone revocation events, default: 10
+        :type poll_interval: int | float
+        :param int stale_duration: Optional, tokens expiring within this many
+                                   seconds are validated again, default: 30
+        :param client: Optional, keystone client used for the validation,
+                       default: created with ``get_admin_client`` on the
+                       session of ``get_cached_admin_session``
+        :param poll_timeout: Optional, timeout of the revocation polls, capped
+                             by the current deadline, default: 5
+        :type poll_timeout: int | float
+        """
+        self.max_size = max_size
+        self.poll_interval = poll_interval
+        self.stale_duration = stale_duration
+        self.poll_timeout = poll_timeout
+        self.hits = 0
+        self.misses = 0
+        self._client = client
+        self._entries = collections.OrderedDict()
+        self._pending = dict()
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._last_poll = None
+        self._since = None
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def client(self):
+        """Keystone client used for validation and revocation polling.
+        Created once, the admin session re-authenticates on its own when its
+        token expires.
+        """
+        if self._client is None:
+            self._client = get_admin_client(get_cached_admin_session())
+        return self._client
+
+    def validate(self, token):
+        """Validates the token, using the cache when possible.
+
+        :param token: Token to be validated
+        :type token: str | unicode
+        :returns: keystoneclient.access.AccessInfoV3
+        :raises keystoneclient.exceptions.NotFound: when the token is not
+                                                    valid
+        :raises cloudcix.deadline.DeadlineExceeded: when the deadline passed
+                                                    while waiting for the
+                                                    validation
+        """
+        deadline.check()
+        self._maybe_poll()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                if entry.expires_at - self.stale_duration > time.time():
+                    self._entries[token] = self._entries.pop(token)
+                    self.hits += 1
+                    return entry.auth_ref
+                del self._entries[token]
+            self.misses += 1
+            pending = self._pending.get(token)
+            leader = pending is None
+            if leader:
+                pending = self._pending[token] = _Pending()
+
+        if not leader:
+            if not pending.done.wait(deadline.remaining()):
+                raise deadline.DeadlineExceeded(
+                    'Deadline exceeded waiting for the token validation')
+            if pending.error is not None:
+                raise pending.error
+            return pending.auth_ref
+
+        try:
+            pending.auth_ref = self._validate(token)
+        except Exception as e:
+            pending.error = e
+            raise
+        else:
+            self._store(token, pending.auth_ref)
+            return pending.auth_ref
+        finally:
+            with self._lock:
+                self._pending.pop(token, None)
+            pending.done.set()
+
+    def invalidate(self, token):
+        """Drops the token from the cache.
+
+        :param token: Token to be dropped
+        :type token: str | unicode
+        """
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self):
+        """Drops every cached token."""
+        with self._lock:
+            self._entries.clear()
+
+    def poll_revocations(self):
+        """Fetches revocation events published since the last poll and drops
+        every cached token they apply to.
+
+        :returns: Number of dropped tokens
+        :rtype: int
+        """
+        started = datetime.datetime.utcnow()
+        if self._since is None and not self._entries:
+            # Nothing cached yet, only remember where to start from
+            self._since = started
+            self._last_poll = time.time()
+            return 0
+        params = {}
+        if self._since is not None:
+            params['since'] = self._since.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        url = self._revocation_url()
+        # The poll runs in a validating thread holding the poll lock, it must
+        # not wait on a hung Keystone forever
+        timeout = deadline.timeout_for(self.poll_timeout)
+        response = self.client.session.get(url, params=params,
+                                           timeout=timeout)
+        events = response.json().get('events', [])
+        dropped = 0
+        if events:
+            with self._lock:
+                for token, entry in list(self._entries.items()):
+                    if any(entry.revoked_by(event) for event in events):
+                        del self._entries[token]
+                        dropped += 1
+        # Overlap the polls by the interval, so events published while the
+        # previous poll was in flight aren't missed. Applying an event twice
+        # is harmless.
+        self._since = started - datetime.timedelta(seconds=self.poll_interval)
+        self._last_poll = time.time()
+        _logger.debug('Applied %d revocation events, dropped %d tokens',
+                      len(events), dropped)
+        return dropped
+
+    def _after_fork(self):
+        """Resets the locks, validations in flight and connections, keeping
+        the cached tokens.
+        """
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._pending = dict()
+        if self._client is not None:
+            reset_keystone_session(self._client.session)
+
+    def _validate(self, token):
+        """Same as client.tokens.validate, bounded by the current deadline"""
+        url = get_required_settings()['auth_url'].rstrip('/') + \
+            TOKENS_PATH
+        response = self.client.session.get(
+            url, headers={'X-Subject-Token': token},
+            timeout=deadline.timeout_for())
+        return access.AccessInfo.factory(resp=response,
+                                         body=response.json())
+
+    def _revocation_url(self):
+        return get_required_settings()['auth_url'].rstrip('/') + \
+            REVOCATION_EVENTS_PATH
+
+    def _maybe_poll(self):
+        if self._last_poll is not None and \
+                time.time() - self._last_poll < self.poll_interval:
+            return
+        # Only one thread polls, the others keep serving from the cache
+        if not self._poll_lock.acquire(False):
+            return
+        try:
+            self.poll_revocations()
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception:
+            # A failed poll must not fail the validation. Retry it with the
+            # next call and play safe by validating everything again.
+            _logger.exception('Polling Keystone revocation events failed')
+            self.clear()
+            self._last_poll = time.time()
+        finally:
+            self._poll_lock.release()
+
+    def _store(self, token, auth_ref):
+        entry = _Entry(auth_ref)
+        with self._lock:
+            self._entries.pop(token, None)
+            self._entries[token] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+@register_after_fork
+def _reset_caches():
+    for cache in list(_caches):
+        # one cache failing to reset must not leave the others inherited
+        try:
+            cache._after_fork()
+        except Exception:
+            _logger.exception('Resetting %r after fork failed', cache)
@@ -0,0 +1,515 @@
+# python
+from __future__ import unicode_literals
+import collections
+import datetime
+import json
+import os
+import threading
+import weakref
+try:
+    from http.cookiejar import DefaultCookiePolicy
+    from urllib.parse import urlencode, urljoin
+except ImportError:  # Python 2
+    from cookielib import DefaultCookiePolicy
+    from urllib import urlencode
+    from urlparse import urljoin
+
+# libs
+import requests
+from requests.models import DEFAULT_REDIRECT_LIMIT
+from requests.utils import get_encoding_from_headers, get_environ_proxies
+
+# local
+from .utils import register_after_fork, reset_requests_session, settings
+
+__all__ = ['Transport', 'RequestsTransport', 'Urllib3Transport',
+           'HttpxTransport', 'Response', 'SentRequest', 'TRANSPORTS',
+           'get_default_transport', 'set_default_transport']
+
+_transports = weakref.WeakSet()
+
+
+#: Request sent by a transport, as found in Response.request
+SentRequest = collections.namedtuple('SentRequest', ['method', 'url',
+                                                     'headers', 'body'])
+
+
+class Response(object):
+    """Response returned by the transports that don't use requests. Offers
+    the parts of requests.Response used with the APIClient: status_code,
+    reason, headers, content, text, encoding, json, iter_content, ok,
+    raise_for_status, url, elapsed and request.
+    """
+
+    def __init__(self, status_code, headers, content, url, reason=None,
+                 elapsed=None, request=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+        self.reason = reason
+        self.elapsed = elapsed or datetime.timedelta(0)
+        self.request = request
+        self.encoding = get_encoding_from_headers(headers)
+
+    def __repr__(self):
+        return u'<Response [%d]>' % self.status_code
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', 'replace')
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self, **kwargs):
+        return json.loads(self.text, **kwargs)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        content = self.text if decode_unicode else self.content
+        chunk_size = chunk_size or max(len(content), 1)
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError('%d %s for url: %s' % (
+                self.status_code, self.reason or 'Error', self.url),
+                response=self)
+
+
+class Transport(object):
+    """Sends the requests made by the APIClient.
+
+    Subclasses implement request, returning an object with the same
+    interface as requests.Response (status_code, headers, content, text,
+    json and raise_for_status). Transports setting templates also receive
+    the uri template of the call (eg. "Contacts/v1/%(idMember)s/Group/")
+    as template.
+    """
+    name = None
+    templates = False
+
+    def __new__(cls, *args, **kwargs):
+        transport = super(Transport, cls).__new__(cls)
+        _transports.add(transport)
+        return transport
+
+    def __repr__(self):
+        return u'<%s>' % self.__class__.__name__
+
+    def request(self, method, uri, headers, data=None, params=None,
+                timeout=None, **kwargs):
+        """Sends a request.
+
+        :param method: HTTP method, eg. "get"
+        :type method: str | unicode
+        :param uri: Absolute uri
+        :type uri: str | unicode
+        :param dict headers: Complete set of headers of the request
+        :param data: Optional, body of the request
+        :type data: str | unicode | bytes
+        :param dict params: Optional, query params
+        :param timeout: Optional, seconds to wait for the server
+        :type timeout: int | float
+        :param kwargs: Any other argument supported by the transport
+        :returns: requests.Response or Response
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Closes the pooled connections"""
+
+    def decoders(self):
+        """Returns the content codings the transport decodes, while the
+        response is read.
+
+        :rtype: frozenset
+        """
+        return frozenset(['gzip', 'deflate'])
+
+    def connect(self, uri, count=1):
+        """Opens connections to the host of the uri ahead of the first
+        request, when the transport supports it.
+
+        :param uri: Any uri on the host
+        :type uri: str | unicode
+        :param int count: Optional, number of connections to open, default: 1
+        """
+
+    def reset(self):
+        """Drops the pooled connections without closing them, used in a
+        forked process where they still belong to the parent.
+        """
+
+
+class RequestsTransport(Transport):
+    """Sends the requests with a requests.Session, keeping connections
+    alive between calls. The default transport.
+    """
+    name = 'requests'
+
+    def __init__(self):
+        self.session = self._new_session()
+
+    @staticmethod
+    def _new_session():
+        session = requests.Session()
+        # Never send cookies set by one call along with the calls made with
+        # other tokens
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    def request(self, method, uri, headers, data=None, params=None,
+                timeout=None, **kwargs):
+        return self.session.request(method, uri, headers=headers, data=data,
+                                    params=params, timeout=timeout, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def decoders(self):
+        from requests.packages import urllib3
+        return _urllib3_decoders(urllib3)
+
+    def connect(self, uri, count=1):
+        pool = self.session.get_adapter(uri).get_connection(uri)
+        _open_connections(pool, count)
+
+    def reset(self):
+        reset_requests_session(self.session)
+
+
+def _default_verify():
+    """CA bundle used when verify isn't given, as requests does"""
+    return os.environ.get('REQUESTS_CA_BUNDLE') or \
+        os.environ.get('CURL_CA_BUNDLE') or True
+
+
+class Urllib3Transport(Transport):
+    """Sends the requests straight through a urllib3 PoolManager, skipping
+    the per call work of requests (hooks, header merging, auth and cookie
+    handling).
+
+    Of the arguments of requests.request, verify, cert, proxies and
+    allow_redirects are supported, others raise TypeError. Like requests,
+    the CA bundle defaults to $REQUESTS_CA_BUNDLE (or the bundle of requests)
+    and proxies to the proxy environment variables, unless trust_env is
+    False.
+    """
+    name = 'urllib3'
+
+    def __init__(self, num_pools=10, maxsize=10, trust_env=True,
+                 **pool_kwargs):
+        """
+        :param int num_pools: Optional, number of hosts with pooled
+                              connections, default: 10
+        :param int maxsize: Optional, connections kept per host, default: 10
+        :param bool trust_env: Optional, read the CA bundle and the proxies
+                               from the environment, default: True
+        :param pool_kwargs: Any other argument of urllib3.PoolManager
+        """
+        try:
+            import urllib3
+        except ImportError:
+            from requests.packages import urllib3
+        self._urllib3 = urllib3
+        self.trust_env = trust_env
+        self._pool_kwargs = dict(pool_kwargs, num_pools=num_pools,
+                                 maxsize=maxsize)
+        self._pools = dict()
+        self._proxies = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        """PoolManager of the requests sent with the default options"""
+        return self._get_pool(None, None, None)
+
+    def _get_pool(self, verify, cert, proxy):
+        if verify is None or verify is True:
+            verify = _default_verify() if self.trust_env else True
+        key = verify, cert, proxy
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = self._pools[key] = self._new_pool(*key)
+        return pool
+
+    def _new_pool(self, verify, cert, proxy):
+        kwargs = dict(self._pool_kwargs)
+        if verify is False:
+            kwargs['cert_reqs'] = 'CERT_NONE'
+        else:
+            kwargs['cert_reqs'] = 'CERT_REQUIRED'
+            if verify is True:
+                from requests.certs import where
+                verify = where()
+            if os.path.isdir(verify):
+                kwargs['ca_cert_dir'] = verify
+            else:
+                kwargs['ca_certs'] = verify
+        if cert:
+            if isinstance(cert, (tuple, list)):
+                kwargs['cert_file'], kwargs['key_file'] = cert
+            else:
+                kwargs['cert_file'] = cert
+        if proxy:
+            return self._urllib3.ProxyManager(proxy, **kwargs)
+        return self._urllib3.PoolManager(**kwargs)
+
+    def _proxy(self, uri, proxies):
+        scheme = uri.split(':', 1)[0]
+        if proxies is None and self.trust_env:
+            netloc = uri.split('/', 3)[2]
+            if netloc not in self._proxies:
+                self._proxies[netloc] = get_environ_proxies(uri)
+            proxies = self._proxies[netloc]
+        return (proxies or {}).get(scheme) or (proxies or {}).get('all')
+
+    def _retries(self, allow_redirects):
+        """Follows up to DEFAULT_REDIRECT_LIMIT redirects as requests does,
+        returning the last one rather than raising, and retries nothing else.
+        """
+        if not allow_redirects:
+            return False
+        kwargs = dict(total=None, connect=False, read=False,
+                      redirect=DEFAULT_REDIRECT_LIMIT, raise_on_redirect=False)
+        Retry = self._urllib3.util.Retry
+        try:
+            return Retry(other=0, **kwargs)
+        except TypeError:  # urllib3 < 1.26
+            return Retry(**kwargs)
+
+    def _error(self, error):
+        """Returns the requests exception matching a urllib3 one"""
+        exceptions = self._urllib3.exceptions
+        if isinstance(error, exceptions.MaxRetryError) and error.reason:
+            error = error.reason
+        if isinstance(error, exceptions.NewConnectionError):
+            return requests.ConnectionError(error)
+        if isinstance(error, exceptions.ConnectTimeoutError):
+            return requests.exceptions.ConnectTimeout(error)
+        if isinstance(error, exceptions.TimeoutError):
+            return requests.exceptions.ReadTimeout(error)
+        if isinstance(error, exceptions.SSLError):
+            return requests.exceptions.SSLError(error)
+        return requests.ConnectionError(error)
+
+    def request(self, method, uri, headers, data=None, params=None,
+                timeout=None, verify=None, cert=None, proxies=None,
+                allow_redirects=True, **kwargs):
+        if kwargs:
+            raise TypeError('Arguments not supported by %s: %s' % (
+                self.name, ', '.join(sorted(kwargs))))
+        if params:
+            uri = '%s%s%s' % (uri, '&' if '?' in uri else '?',
+                              urlencode(params, doseq=True))
+        if isinstance(data, type('')):
+            data = data.encode('utf-8')
+        if timeout is None:
+            timeout = self._urllib3.Timeout.DEFAULT_TIMEOUT
+        elif isinstance(timeout, tuple):  # (connect, read) as in requests
+            timeout = self._urllib3.Timeout(connect=timeout[0],
+                                            read=timeout[1])
+        pool = self._get_pool(verify, cert, self._proxy(uri, proxies))
+        started = datetime.datetime.now()
+        try:
+            response = pool.urlopen(method.upper(), uri, body=data,
+                                    headers=headers, timeout=timeout,
+                                    retries=self._retries(allow_redirects),
+                                    redirect=allow_redirects)
+        except self._urllib3.exceptions.HTTPError as e:
+            # raise the same exceptions as the requests transport
+            raise self._error(e)
+        url = uri
+        retries = getattr(response, 'retries', None)
+        for redirect in getattr(retries, 'history', None) or ():
+            if redirect.redirect_location:
+                url = urljoin(redirect.url, redirect.redirect_location)
+        return Response(response.status, response.headers, response.data,
+                        url, response.reason,
+                        datetime.datetime.now() - started,
+                        SentRequest(method.upper(), uri, headers, data))
+
+    def close(self):
+        for pool in list(self._pools.values()):
+            pool.clear()
+
+    def decoders(self):
+        return _urllib3_decoders(self._urllib3)
+
+    def connect(self, uri, count=1):
+        pool = self._get_pool(None, None, self._proxy(uri, None))
+        _open_connections(pool.connection_from_url(uri), count)
+
+    def reset(self):
+        self._pools = dict()
+        self._lock = threading.Lock()
+
+
+class HttpxTransport(Transport):
+    """Sends the requests with a httpx.Client. Requires httpx to be
+    installed.
+
+    Of the arguments of requests.request, verify, cert and allow_redirects
+    are supported, others raise TypeError; set proxies with the arguments of
+    httpx.Client. The CA bundle defaults to $REQUESTS_CA_BUNDLE, httpx reads
+    the proxy environment variables itself.
+    """
+    name = 'httpx'
+
+    def __init__(self, **client_kwargs):
+        """
+        :param client_kwargs: Any argument of httpx.Client,
+                              eg. limits, http2 or proxy
+        """
+        import httpx
+        self._client_kwargs = client_kwargs
+        self._clients = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """httpx.Client of the requests sent with the default options"""
+        return self._get_client(None, None)
+
+    def _get_client(self, verify, cert):
+        key = verify, cert
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = self._new_client(*key)
+        return client
+
+    def _new_client(self, verify, cert):
+        import httpx
+        kwargs = dict(self._client_kwargs)
+        if verify is not None:
+            kwargs['verify'] = verify
+        elif 'verify' not in kwargs and kwargs.get('trust_env', True):
+            kwargs['verify'] = _default_verify()
+        if cert is not None:
+            kwargs['cert'] = cert
+        return httpx.Client(**kwargs)
+
+    def request(self, method, uri, headers, data=None, params=None,
+                timeout=None, verify=None, cert=None, allow_redirects=True,
+                **kwargs):
+        import httpx
+        if kwargs:
+            raise TypeError('Arguments not supported by %s: %s' % (
+                self.name, ', '.join(sorted(kwargs))))
+        if isinstance(timeout, tuple):  # (connect, read) as in requests
+            timeout = httpx.Timeout(None, connect=timeout[0],
+                                    read=timeout[1])
+        client = self._get_client(verify, cert)
+        try:
+            response = client.request(method.upper(), uri, headers=headers,
+                                      content=data, params=params,
+                                      timeout=timeout,
+                                      follow_redirects=allow_redirects)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e)
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(e)
+        return Response(response.status_code, response.headers,
+                        response.content, str(response.url),
+                        response.reason_phrase, response.elapsed,
+                        SentRequest(method.upper(), str(response.url),
+                                    headers, data))
+
+    def close(self):
+        for client in list(self._clients.values()):
+            client.close()
+
+    def decoders(self):
+        try:
+            from httpx._decoders import SUPPORTED_DECODERS
+        except ImportError:
+            return super(HttpxTransport, self).decoders()
+        return frozenset(SUPPORTED_DECODERS) - frozenset(['identity'])
+
+    def reset(self):
+        self._clients = dict()
+        self._lock = threading.Lock()
+
+
+def _urllib3_decoders(urllib3):
+    """Content codings decoded by the urllib3 module, brotli and zstd depend
+    on the installed libraries and the version of urllib3.
+    """
+    decoders = set(['gzip', 'deflate'])
+    if getattr(urllib3.response, 'brotli', None) is not None:
+        decoders.add('br')
+    if getattr(urllib3.response, 'HAS_ZSTD', False):
+        decoders.add('zstd')
+    return frozenset(decoders)
+
+
+def _open_connections(pool, count):
+    """Connects up to count connections of a urllib3 connection pool"""
+    connections = list()
+    try:
+        for _ in range(count):
+            connection = pool._get_conn()
+            if connection.sock is None:
+                connection.connect()
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            pool._put_conn(connection)
+
+
+TRANSPORTS = {
+    RequestsTransport.name: RequestsTransport,
+    Urllib3Transport.name: Urllib3Transport,
+    HttpxTransport.name: HttpxTransport,
+}
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport():
+    """Returns the transport used by the clients created without one,
+    selected by the CLOUDCIX_TRANSPORT setting (one of the TRANSPORTS names),
+    default: "requests".
+
+    :rtype: Transport
+    """
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                try:
+                    name = getattr(settings, 'CLOUDCIX_TRANSPORT', None)
+                except ImportError:
+                    name = os.environ.get('CLOUDCIX_TRANSPORT')
+                _default_transport = TRANSPORTS[name or 'requests']()
+    return _default_transport
+
+
+def set_default_transport(transport):
+    """Replaces the transport used by the clients created without one.
+
+    :param Transport transport: New default transport
+    """
+    global _default_transport
+    _default_transport = transport
+
+
+@register_after_fork
+def _reset_transports():
+    global _default_transport_lock
+    _default_transport_lock = threading.Lock()
+    for transport in list(_transports):
+        transport.reset()
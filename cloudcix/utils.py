@@ -1,9 +1,12 @@
 # python
 from __future__ import unicode_literals
 import importlib
+import logging
 import os
+import threading
 
 # libs
+from requests.adapters import HTTPAdapter
 from keystoneclient.session import Session as KeystoneSession
 from keystoneclient.v3.client import Client as KeystoneClient
 
@@ -11,7 +14,10 @@ from keystoneclient.v3.client import Client as KeystoneClient
 from .cloudcixauth import CloudCIXAuth
 
 __all__ = ['KeystoneSession', 'KeystoneClient', 'settings',
-           'get_admin_session', 'get_admin_client']
+           'get_admin_session', 'get_admin_client',
+           'get_cached_admin_session', 'register_after_fork', 'after_fork']
+
+_logger = logging.getLogger(__name__)
 
 
 def new_method_proxy(func):
@@ -70,7 +76,14 @@ def get_required_settings():
     return settings_obj
 
 
-def get_admin_session(**kw):
+def get_admin_session(session=None, **kw):
+    """Returns a KeystoneSession logged in with the admin credentials of the
+    settings.
+
+    :param requests.Session session: Optional, session sending the requests
+                                     of Keystone, eg. Recorder.session()
+    :param kw: Any other argument of CloudCIXAuth
+    """
     settings_obj = get_required_settings()
     t = CloudCIXAuth(
         auth_url=settings_obj['auth_url'],
@@ -78,14 +91,93 @@ def get_admin_session(**kw):
         password=settings_obj['password'],
         idMember=settings_obj['idMember'],
         **kw)
-    admin_session = KeystoneSession(auth=t)
+    admin_session = KeystoneSession(auth=t, session=session)
     admin_session.get_token()
     return admin_session
 
 
-def get_admin_client():
+def get_admin_client(admin_session=None):
     settings_obj = get_required_settings()
-    admin_session = get_admin_session()
+    admin_session = admin_session or get_admin_session()
     return KeystoneClient(session=admin_session,
                           auth_url=settings_obj['auth_url'],
                           endpoint_override=settings_obj['auth_url'])
+
+
+_admin_session = None
+_admin_session_lock = threading.Lock()
+
+
+def get_cached_admin_session():
+    """Returns an admin session created once per process, and inherited by
+    forked processes. The session gets a new token by itself when its token
+    expires.
+    """
+    global _admin_session
+    if _admin_session is None:
+        with _admin_session_lock:
+            if _admin_session is None:
+                _admin_session = get_admin_session()
+    return _admin_session
+
+
+_after_fork_callbacks = list()
+_after_fork_pid = None
+
+
+def register_after_fork(func):
+    """Registers a function called in child processes after a fork, to reset
+    state that can't be shared with the parent (sockets, locks, threads).
+    Can be used as a decorator.
+    """
+    _after_fork_callbacks.append(func)
+    return func
+
+
+def after_fork():
+    """Runs the functions registered with register_after_fork. Called
+    automatically on Python versions supporting os.register_at_fork,
+    otherwise call it from the post fork hook of the server, eg. gunicorn's
+    post_fork. Runs once per process.
+    """
+    global _after_fork_pid
+    if _after_fork_pid == os.getpid():
+        return
+    _after_fork_pid = os.getpid()
+    for func in _after_fork_callbacks:
+        try:
+            func()
+        except Exception:
+            _logger.exception('After fork callback %r failed', func)
+
+
+def reset_requests_session(session):
+    """Drops the pooled connections of a requests.Session without closing
+    them, keeping its mounted adapters (and their options). Used in a forked
+    process, where the connections still belong to the parent.
+    """
+    for adapter in session.adapters.values():
+        if isinstance(adapter, HTTPAdapter):
+            adapter.init_poolmanager(adapter._pool_connections,
+                                     adapter._pool_maxsize,
+                                     block=adapter._pool_block)
+            adapter.proxy_manager = dict()
+
+
+def reset_keystone_session(session):
+    """Drops the connections of a keystone session, keeping its auth
+    (and token) and the adapters of its requests.Session.
+    """
+    reset_requests_session(session.session)
+
+
+@register_after_fork
+def _reset_admin_session():
+    global _admin_session_lock
+    _admin_session_lock = threading.Lock()
+    if _admin_session is not None:
+        reset_keystone_session(_admin_session)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=after_fork)
@@ -0,0 +1,149 @@
+# python
+from __future__ import unicode_literals
+import gc
+import logging
+import socket
+import time
+try:
+    from urllib.parse import urlparse
+except ImportError:  # Python 2
+    from urlparse import urlparse
+
+# libs
+
+# local
+from .api import get_services
+from .utils import after_fork, get_cached_admin_session, \
+    get_required_settings, settings
+
+__all__ = ['warm_up', 'post_fork']
+
+_logger = logging.getLogger(__name__)
+
+
+def _server_urls(clients):
+    urls = set(client.server_url for client in clients)
+    try:
+        urls.add(get_required_settings()['auth_url'])
+    except (AttributeError, KeyError):
+        pass
+    return sorted(urls)
+
+
+def _connect(clients, connections):
+    done = set()
+    for client in clients:
+        transport, uri = client.transport, client.server_url
+        if (id(transport), uri) in done:
+            continue
+        done.add((id(transport), uri))
+        try:
+            transport.connect(uri, connections)
+        except Exception as e:
+            _logger.warning('Could not connect to %s: %s', uri, e)
+
+
+def warm_up(resolve=True, login=False, connect=False, connections=1,
+            freeze=False):
+    """Does the work every process otherwise does on its first request.
+    Meant to run in the master process of a pre-fork server (gunicorn,
+    uwsgi) before the workers are forked, so the workers inherit the result.
+
+    Loads the settings, prepares the clients of cloudcix.api and the default
+    transport, and optionally resolves the API and Keystone host names (which
+    warms the resolver cache of the system), logs in to Keystone with the
+    admin credentials and opens connections.
+
+    Connections opened before the fork are dropped in the workers by
+    post_fork, as sockets can't be shared between processes; use connect
+    to warm up a master that also serves requests, and post_fork(connect=True)
+    in the workers.
+
+    Example gunicorn configuration::
+
+        from cloudcix import warmup
+
+        def on_starting(server):
+            warmup.warm_up(login=True)
+
+        def post_fork(server, worker):
+            warmup.post_fork(connect=True)
+
+    :param bool resolve: Optional, resolve the host names, default: True
+    :param bool login: Optional, log in the admin session shared through
+                       get_cached_admin_session, default: False
+    :param bool connect: Optional, open connections, default: False
+    :param int connections: Optional, connections opened per host,
+                            default: 1
+    :param bool freeze: Optional, move every object created so far to the
+                        permanent generation of the garbage collector
+                        (Python 3.7+), so collections in the workers don't
+                        touch them and their memory stays shared. They are
+                        never collected afterwards; only use it when
+                        warm_up runs right before the workers are forked,
+                        ideally with gc.disable() early in the master as
+                        the documentation of gc.freeze advises,
+                        default: False
+    :returns: Time spent on every step, in seconds
+    :rtype: dict
+    """
+    timings = dict()
+
+    started = time.time()
+    try:
+        settings.CLOUDCIX_SERVER_URL
+    except (ImportError, AttributeError):
+        pass
+    timings['settings'] = time.time() - started
+
+    started = time.time()
+    clients = list(get_services().values())
+    for client in clients:
+        client.compile()
+        client.transport
+    timings['clients'] = time.time() - started
+
+    if resolve:
+        started = time.time()
+        for url in _server_urls(clients):
+            parsed = urlparse(url)
+            try:
+                socket.getaddrinfo(parsed.hostname, parsed.port or (
+                    443 if parsed.scheme == 'https' else 80))
+            except socket.error as e:
+                _logger.warning('Could not resolve %s: %s', url, e)
+        timings['resolve'] = time.time() - started
+
+    if login:
+        started = time.time()
+        get_cached_admin_session().get_token()
+        timings['login'] = time.time() - started
+
+    if connect:
+        started = time.time()
+        _connect(clients, connections)
+        timings['connect'] = time.time() - started
+
+    if freeze and hasattr(gc, 'freeze'):
+        gc.freeze()
+
+    _logger.info('Warm up done: %s', ', '.join(
+        '%s %.3fs' % item for item in sorted(timings.items())))
+    return timings
+
+
+def post_fork(connect=False, connections=1):
+    """Resets the state inherited from the master that can't be shared
+    (connections, locks, validations in flight) and keeps everything else,
+    eg. cached tokens, the admin token and the prepared clients. Call it from
+    the post fork hook of the server; on Python 3.7+ the reset also runs
+    automatically after every fork.
+
+    :param bool connect: Optional, open connections of the worker,
+                         default: False
+    :param int connections: Optional, connections opened per host,
+                            default: 1
+    """
+    after_fork()
+    if connect:
+        _connect(list(get_services().values()), connections)
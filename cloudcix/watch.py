@@ -0,0 +1,245 @@
+# python
+from __future__ import unicode_literals
+import collections
+import datetime
+import hashlib
+import json
+import logging
+import threading
+
+# libs
+
+# local
+
+__all__ = ['Event', 'Watcher', 'CREATED', 'UPDATED', 'DELETED', 'ALL']
+
+_logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+ALL = '*'
+
+#: Change of a single record. ``record`` is None for deleted records.
+Event = collections.namedtuple('Event', ['type', 'pk', 'record'])
+
+# What is remembered about a page fetched during a full sync
+_Page = collections.namedtuple('_Page', ['etag', 'last_modified', 'pks',
+                                         'total'])
+
+
+def record_hash(record):
+    """Returns a compact (8 bytes) fingerprint of the record, used to tell if
+    the record has changed since the previous poll.
+
+    :param dict record: Record as returned by the API
+    :rtype: bytes
+    """
+    data = json.dumps(record, sort_keys=True, separators=(',', ':'))
+    return hashlib.md5(data.encode('utf-8')).digest()[:8]
+
+
+class Watcher(object):
+    """Polls a collection and emits only the records that were created,
+    updated or deleted since the previous poll.
+
+    Only a fingerprint of every record is kept in memory. Pages of a full
+    listing are requested conditionally (``If-None-Match`` /
+    ``If-Modified-Since``), so pages the server reports as unchanged cost
+    neither bandwidth nor hashing. When the service supports filtering on the
+    modification date, pass the name of that query param as
+    ``modified_since_param`` and only records changed since the previous poll
+    are fetched; as such a listing can't reveal deleted records a full sync
+    still runs every ``full_sync_every`` polls.
+
+    Events are passed to the callbacks registered with ``on`` and yielded by
+    ``events``::
+
+        watcher = api.dns.record.watch('idRecord', token=token, interval=60)
+        watcher.on(DELETED, lambda event: cache.pop(event.pk, None))
+        for event in watcher.events():
+            if event.type != DELETED:
+                cache[event.pk] = event.record
+    """
+
+    def __init__(self, client, pk_field, token=None, params=None,
+                 interval=30, page_size=100, modified_since_param=None,
+                 full_sync_every=10, emit_initial=True, **kwargs):
+        """
+        :param client: Client of the watched collection
+        :type client: cloudcix.base.APIClient
+        :param pk_field: Name of the field holding the primary key of the
+                         records, eg. "idUser"
+        :type pk_field: str | unicode
+        :param token: Optional, Token to be used for the requests.
+        :type token: str | unicode
+        :param dict params: Optional, Query params limiting the watched
+                            records.
+        :param interval: Optional, seconds between two polls made by the
+                         events method, default: 30
+        :type interval: int | float
+        :param int page_size: Optional, number of records requested per page,
+                              default: 100
+        :param modified_since_param: Optional, query param filtering the
+                                     records modified since a date,
+                                     eg. "modified__gte", default: None (every
+                                     poll is a full sync)
+        :type modified_since_param: str | unicode
+        :param int full_sync_every: Optional, when modified_since_param is
+                                    used, every how many polls a full sync
+                                    is made to detect deletions, default: 10
+        :param bool emit_initial: Optional, whether the records found by the
+                                  first poll are emitted as created,
+                                  default: True
+        :param kwargs: Any other argument passed to the list calls, eg.
+                       arguments required by the service uri
+        """
+        self.client = client
+        self.pk_field = pk_field
+        self.token = token
+        self.params = dict(params or {})
+        self.interval = interval
+        self.page_size = page_size
+        self.modified_since_param = modified_since_param
+        self.full_sync_every = full_sync_every
+        self.emit_initial = emit_initial
+        self.kwargs = kwargs
+        self._hashes = dict()
+        self._pages = dict()
+        self._listeners = collections.defaultdict(list)
+        self._polls = 0
+        self._since = None
+        self._stopped = threading.Event()
+
+    def __repr__(self):
+        return u'<Watcher(%r)>' % self.client
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def on(self, event_type, callback):
+        """Registers a callback called with every emitted event of the type.
+
+        :param event_type: One of CREATED, UPDATED, DELETED or ALL
+        :type event_type: str | unicode
+        :param callback: Callable accepting an Event
+        """
+        self._listeners[event_type].append(callback)
+
+    def poll(self):
+        """Polls the collection once.
+
+        :returns: List of events since the previous poll
+        :rtype: list
+        """
+        started = datetime.datetime.utcnow()
+        full = self._since is None or self.modified_since_param is None or \
+            self._polls % self.full_sync_every == 0
+        if full:
+            events = self._full_sync()
+        else:
+            events = self._incremental_sync()
+        initial = self._polls == 0
+        self._polls += 1
+        self._since = started
+        if initial and not self.emit_initial:
+            return []
+        for event in events:
+            for callback in self._listeners[event.type] + \
+                    self._listeners[ALL]:
+                callback(event)
+        return events
+
+    def events(self):
+        """Polls the collection every ``interval`` seconds until ``stop`` is
+        called.
+
+        :returns: Generator yielding events
+        """
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            for event in self.poll():
+                yield event
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        """Stops the events generator after the current poll."""
+        self._stopped.set()
+
+    def _apply(self, record):
+        pk = record[self.pk_field]
+        fingerprint = record_hash(record)
+        previous = self._hashes.get(pk)
+        if previous == fingerprint:
+            return pk, None
+        self._hashes[pk] = fingerprint
+        return pk, Event(CREATED if previous is None else UPDATED, pk, record)
+
+    def _full_sync(self):
+        events = []
+        seen = set()
+        fetched = 0
+        page = self.client.first_page
+        while True:
+            cached = self._pages.get(page)
+            headers = {}
+            if cached is not None:
+                if cached.etag:
+                    headers['If-None-Match'] = cached.etag
+                if cached.last_modified:
+                    headers['If-Modified-Since'] = cached.last_modified
+            params = dict(self.params)
+            params[self.client.page_param] = page
+            params[self.client.limit_param] = self.page_size
+            response = self.client.list(token=self.token, params=params,
+                                        headers=headers, **self.kwargs)
+            if response.status_code == 304 and cached is not None:
+                pks, total = cached.pks, cached.total
+            else:
+                response.raise_for_status()
+                body = response.json()
+                total = body.get('_metadata', {}).get('totalRecords')
+                pks = []
+                for record in body['content']:
+                    pk, event = self._apply(record)
+                    pks.append(pk)
+                    if event is not None:
+                        events.append(event)
+                self._pages[page] = _Page(
+                    response.headers.get('ETag'),
+                    response.headers.get('Last-Modified'), pks, total)
+            seen.update(pks)
+            fetched += len(pks)
+            if total is None:
+                if len(pks) < self.page_size:
+                    break
+            elif fetched >= total or not pks:
+                # the server may cap the page size below page_size
+                break
+            page += 1
+
+        for stale_page in [p for p in self._pages if p > page]:
+            del self._pages[stale_page]
+        for pk in [pk for pk in self._hashes if pk not in seen]:
+            del self._hashes[pk]
+            events.append(Event(DELETED, pk, None))
+        _logger.debug('Full sync of %r: %d records, %d changes', self.client,
+                      len(seen), len(events))
+        return events
+
+    def _incremental_sync(self):
+        events = []
+        params = dict(self.params)
+        # Overlap the polls, records seen twice don't produce events
+        since = self._since - datetime.timedelta(seconds=self.interval)
+        params[self.modified_since_param] = since.strftime(
+            '%Y-%m-%dT%H:%M:%S')
+        for record in self.client.iter_list(self.token, params,
+                                            self.page_size, **self.kwargs):
+            pk, event = self._apply(record)
+            if event is not None:
+                events.append(event)
+        # Pages of the full listing have changed, their validators are stale
+        if events:
+            self._pages.clear()
+        return events
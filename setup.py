@@ -21,6 +21,11 @@ setup(
     ],
     keywords=['cix', 'cloudcix', 'bindings', 'client'],
     install_requires=requires,
+    entry_points={
+        'console_scripts': [
+            'cloudcix = cloudcix.cli:main',
+        ],
+    },
     package_data={'': ['LICENSE', 'README.md']},
     package_dir={'cloudcix': 'cloudcix'},
     include_package_data=True,
@@ -0,0 +1,74 @@
+# python
+from __future__ import unicode_literals
+import collections
+import json
+import os
+import sys
+import threading
+import zlib
+
+# libs
+
+# test imports
+
+ROOT = lambda base: os.path.abspath(os.path.join(
+    os.path.dirname(__file__), base).replace('\\', '/'))
+sys.path.insert(0, ROOT('../'))
+
+# the clients of cloudcix.api are created on import, no call reaches it
+os.environ.setdefault('CLOUDCIX_SERVER_URL', 'http://stub')
+
+from cloudcix.base import APIClient
+from cloudcix.transport import Response, Transport
+
+#: Request received by a StubTransport, data is the decoded JSON body
+Call = collections.namedtuple('Call', ['method', 'uri', 'headers', 'data',
+                                       'params', 'timeout'])
+
+
+class StubTransport(Transport):
+    """Transport answering the calls of the tests without any network.
+
+    The handler receives every Call and returns the status, the JSON body
+    (None for an empty body) and optionally the response headers.
+    """
+    name = 'stub'
+
+    def __init__(self, handler=None):
+        self.handler = handler or (lambda call: (200, {'content': []}))
+        self.calls = list()
+        self._lock = threading.Lock()
+
+    def request(self, method, uri, headers, data=None, params=None,
+                timeout=None, **kwargs):
+        if data and headers.get('Content-Encoding') == 'gzip':
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        body = json.loads(data.decode('utf-8')) if data else None
+        call = Call(method, uri, dict(headers), body, dict(params or {}),
+                    timeout)
+        with self._lock:
+            self.calls.append(call)
+        result = self.handler(call)
+        status, body = result[:2]
+        headers = result[2] if len(result) > 2 else {}
+        content = b'' if body is None else json.dumps(body).encode('utf-8')
+        return Response(status, headers, content, uri)
+
+
+def paginate(call, records, max_limit=None):
+    """Answers a list call with the requested page of the records, of at most
+    max_limit records like a server capping the page size.
+    """
+    page = int(call.params.get('page', 0))
+    limit = int(call.params.get('limit', 100))
+    if max_limit is not None:
+        limit = min(limit, max_limit)
+    return 200, {'content': records[page * limit:(page + 1) * limit],
+                 '_metadata': {'totalRecords': len(records)}}
+
+
+def stub_client(handler=None, service_uri='Record/'):
+    """Returns an APIClient sending its calls to a new StubTransport"""
+    return APIClient(application='Test', service_uri=service_uri,
+                     server_url='http://stub',
+                     transport=StubTransport(handler))
@@ -0,0 +1,40 @@
+# python
+from __future__ import unicode_literals
+import unittest
+
+# libs
+
+# test imports
+from stubs import paginate, stub_client
+
+
+class TestIterList(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [{'idRecord': i} for i in range(10)]
+
+    def test_pages(self):
+        client = stub_client(lambda call: paginate(call, self.records))
+        pages = list(client.iter_pages(token='t', page_size=4))
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        self.assertEqual(len(client.transport.calls), 3)
+
+    def test_server_page_cap(self):
+        client = stub_client(lambda call: paginate(call, self.records, 2))
+        records = list(client.iter_list(token='t', page_size=5))
+        self.assertEqual(records, self.records)
+
+    def test_short_page_without_total(self):
+        def handle(call):
+            status, body = paginate(call, self.records)
+            del body['_metadata']
+            return status, body
+
+        client = stub_client(handle)
+        self.assertEqual(len(list(client.iter_list(token='t', page_size=4))),
+                         10)
+        self.assertEqual(len(client.transport.calls), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
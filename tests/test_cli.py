@@ -0,0 +1,163 @@
+# python
+from __future__ import unicode_literals
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+# libs
+import requests
+
+# test imports
+from stubs import StubTransport, paginate
+from cloudcix import api
+from cloudcix.cli import _with_retries, main
+from cloudcix.deadline import Deadline
+from cloudcix.transport import Response
+
+
+class CLITestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.records = [{'idRecord': i} for i in range(10)]
+        self.failing_pages = set()
+        self.max_limit = None
+        self.transport = api.dns.record.transport
+        self.stub = api.dns.record.transport = StubTransport(self.handle)
+        self.stderr = sys.stderr
+        sys.stderr = open(os.devnull, 'w')
+
+    def tearDown(self):
+        sys.stderr.close()
+        sys.stderr = self.stderr
+        api.dns.record.transport = self.transport
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def handle(self, call):
+        if call.method == 'get':
+            if int(call.params['page']) in self.failing_pages:
+                return 503, None
+            return paginate(call, self.records, self.max_limit)
+        records = call.data if isinstance(call.data, list) else [call.data]
+        if any(r.get('bad') for r in records):
+            return 400, {'detail': 'bad record'}
+        return 201, {'content': call.data}
+
+    def main(self, *args):
+        return main(list(args) + ['--token', 't', '--retries', '1'])
+
+    def read(self, path):
+        with gzip.open(path, 'rb') as f:
+            return [json.loads(line.decode('utf-8')) for line in f]
+
+
+class TestExport(CLITestCase):
+
+    def export(self, *args):
+        return self.main('export', 'dns.record', '-o', self.path('out.gz'),
+                         '--page-size', '2', '--concurrency', '2', *args)
+
+    def test_export(self):
+        self.assertEqual(self.export(), 0)
+        self.assertEqual(self.read(self.path('out.gz')), self.records)
+        self.assertFalse(os.path.exists(self.path('out.gz.checkpoint')))
+        # pages 0 to 4, plus page 5 fetched with page 4
+        self.assertEqual(len(self.stub.calls), 6)
+
+    def test_server_page_cap(self):
+        self.max_limit = 1
+        self.assertEqual(self.export(), 0)
+        self.assertEqual(self.read(self.path('out.gz')), self.records)
+
+    def test_resume(self):
+        self.failing_pages.add(3)
+        self.assertEqual(self.export(), 1)
+        with open(self.path('out.gz.checkpoint')) as f:
+            state = json.load(f)
+        self.assertEqual((state['page'], state['records']), (3, 6))
+        self.assertEqual(self.read(self.path('out.gz')), self.records[:6])
+        # a batch torn by a crash after the checkpoint is dropped
+        with open(self.path('out.gz'), 'ab') as f:
+            f.write(b'\x1f\x8b\x08torn')
+        self.assertEqual(os.path.getsize(self.path('out.gz')),
+                         state['offset'] + 7)
+        self.failing_pages.clear()
+        del self.stub.calls[:]
+        self.assertEqual(self.export('--resume'), 0)
+        self.assertEqual(self.read(self.path('out.gz')), self.records)
+        self.assertEqual(int(self.stub.calls[0].params['page']), 3)
+        self.assertFalse(os.path.exists(self.path('out.gz.checkpoint')))
+
+    def test_resume_errors(self):
+        self.failing_pages.add(1)
+        self.export()
+        os.rename(self.path('out.gz'), self.path('other.gz'))
+        self.assertEqual(self.export('--resume'), 2)
+        os.rename(self.path('other.gz'), self.path('out.gz'))
+        self.assertEqual(self.main(
+            'export', 'dns.domain', '-o', self.path('out.gz'), '--resume',
+            '--checkpoint', self.path('out.gz.checkpoint')), 2)
+
+
+class TestImport(CLITestCase):
+
+    def test_failed_records(self):
+        path = self.path('in.gz')
+        with gzip.open(path, 'wb') as f:
+            for i in range(5):
+                record = {'idRecord': i, 'name': 'r%d' % i, 'bad': i == 2}
+                f.write(json.dumps(record).encode('utf-8') + b'\n')
+        failed = self.path('failed.gz')
+        self.assertEqual(self.main('import', 'dns.record', path,
+                                   '--chunk-size', '2', '--exclude',
+                                   'idRecord', '--failed', failed), 1)
+        self.assertEqual([r['name'] for r in self.read(failed)],
+                         ['r2', 'r3'])
+        posts = [c.data for c in self.stub.calls]
+        self.assertIn({'name': 'r4', 'bad': False}, posts)
+        self.assertTrue(all('idRecord' not in r for r in posts[0]))
+
+
+class TestRetries(unittest.TestCase):
+
+    def call(self, *outcomes):
+        outcomes = list(outcomes)
+        self.calls = 0
+
+        def call():
+            self.calls += 1
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return Response(outcome, {}, b'', 'http://stub')
+        return call
+
+    def test_retries(self):
+        response = _with_retries(self.call(503, IOError('reset'), 200), 2)
+        self.assertEqual((response.status_code, self.calls), (200, 3))
+        with self.assertRaises(requests.HTTPError):
+            _with_retries(self.call(400, 200), 2)
+        self.assertEqual(self.calls, 1)
+        with self.assertRaises(IOError):
+            _with_retries(self.call(IOError('reset'), IOError('reset')), 1)
+
+    def test_deadline(self):
+        started = time.time()
+        with Deadline(0.25):
+            with self.assertRaises(requests.HTTPError):
+                _with_retries(self.call(*[500] * 10), 9)
+        # 0.1s and 0.2s back offs don't fit in the budget together
+        self.assertEqual(self.calls, 2)
+        self.assertLess(time.time() - started, 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
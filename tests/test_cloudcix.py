@@ -17,6 +17,7 @@ from cloudcix import api
 from cloudcix.utils import (get_admin_session, get_admin_client, settings,
     KeystoneSession)
 from cloudcix.cloudcixauth import CloudCIXAuth, KeystoneTokenAuth
+from cloudcix.tokencache import TokenCache
 from keystoneclient.exceptions import NotFound
 
 
@@ -95,5 +96,27 @@ class TestAPIUseCases(unittest.TestCase):
         self.assertNotIn(session.get_token(), [token, '', None])
         self.assertTrue(session.auth.auth_ref)
 
+    def test_token_cache(self):
+        """
+        1) Get a token for a user
+        2) validate it twice, the second time from the cache
+        3) revoke the token and make sure the cache drops it"""
+        auth = CloudCIXAuth(
+            auth_url=settings.OPENSTACK_KEYSTONE_URL,
+            username=settings.CLOUDCIX_API_USERNAME,
+            password=settings.CLOUDCIX_API_PASSWORD)
+        user_token = KeystoneSession(auth=auth).get_token()
+
+        token_cache = TokenCache(poll_interval=0)
+        auth_ref = token_cache.validate(user_token)
+        self.assertEqual(token_cache.validate(user_token), auth_ref)
+        self.assertEqual(token_cache.hits, 1)
+
+        token_cache.client.tokens.revoke_token(user_token)
+        token_cache.poll_revocations()
+        self.assertEqual(len(token_cache), 0)
+        with self.assertRaises(NotFound):
+            token_cache.validate(user_token)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,49 @@
+# python
+from __future__ import unicode_literals
+import json
+import unittest
+
+# libs
+
+# test imports
+from stubs import stub_client
+from cloudcix.compression import CODECS, Compression
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_threshold(self):
+        compression = Compression(compress_requests=True, threshold=100)
+        self.assertEqual(compression.encode(b'{}'), (b'{}', None))
+        body = json.dumps(list(range(100))).encode('utf-8')
+        compressed, encoding = compression.encode(body)
+        self.assertEqual(encoding, 'gzip')
+        self.assertLess(len(compressed), len(body))
+        self.assertEqual(CODECS['gzip'][1](compressed), body)
+
+    def test_disabled(self):
+        body = b' ' * 10000
+        self.assertEqual(Compression().encode(body), (body, None))
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            Compression(compress_requests=True, request_codec='deflate')
+
+    def test_headers(self):
+        client = stub_client()
+        client.compression = Compression(accept=('zstd', 'gzip'),
+                                         compress_requests=True,
+                                         threshold=10)
+        client.create(token='t', data={'name': 'x' * 100})
+        client.list(token='t', headers={'Accept-Encoding': 'identity'})
+        create, list_ = client.transport.calls
+        self.assertEqual(create.data, {'name': 'x' * 100})
+        # the stub transport only decodes gzip and deflate
+        self.assertEqual(create.headers['Accept-Encoding'], 'gzip')
+        self.assertEqual(create.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(list_.headers['Accept-Encoding'], 'identity')
+        self.assertNotIn('Content-Encoding', list_.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# python
+from __future__ import unicode_literals
+from array import array
+import unittest
+
+# libs
+
+# test imports
+from stubs import paginate, stub_client
+from cloudcix.contactsync import (GROUP_FIELD, Reconciler, _difference,
+                                  _id_set)
+
+
+class TestIdSet(unittest.TestCase):
+
+    def test_sorted_ids_are_kept(self):
+        self.assertEqual(_id_set([1, 2, 5]), array('L', [1, 2, 5]))
+        self.assertEqual(_id_set([]), array('L'))
+
+    def test_unsorted_ids_and_duplicates(self):
+        self.assertEqual(_id_set([5, 1, 2, 5, 1]), array('L', [1, 2, 5]))
+        self.assertEqual(_id_set([1, 2, 2, 3]), array('L', [1, 2, 3]))
+
+    def test_difference(self):
+        adds, removes, unchanged = _difference(array('L', [1, 2, 4, 7]),
+                                               array('L', [2, 3, 4, 8, 9]))
+        self.assertEqual((list(adds), list(removes), unchanged),
+                         ([3, 8, 9], [1, 7], 2))
+
+
+class TestReconciler(unittest.TestCase):
+
+    def setUp(self):
+        self.members = [{'idContact': pk} for pk in (1, 2, 3, 4)]
+        self.client = stub_client(self.handle,
+                                  service_uri='Group/%(idGroup)s/Contact/')
+        self.reconciler = Reconciler(self.client, GROUP_FIELD, 7, token='t',
+                                     concurrency=1, chunk_size=2)
+
+    def handle(self, call):
+        if call.method == 'get':
+            return paginate(call, self.members)
+        return 200, None
+
+    def test_plan(self):
+        plan = self.reconciler.plan(['4', '3', '9', '5', '6', '9'])
+        self.assertEqual((list(plan.adds), list(plan.removes),
+                          plan.unchanged), ([5, 6, 9], [1, 2], 2))
+        self.assertEqual(len(plan), 5)
+
+    def test_apply(self):
+        plan = self.reconciler.plan([3, 4, 5, 6, 9])
+        calls = self.client.transport.calls
+        del calls[:]
+        self.assertEqual(self.reconciler.apply(plan), [])
+        self.assertEqual([(c.method, c.data) for c in calls], [
+            ('post', [{'idContact': 5}, {'idContact': 6}]),
+            ('post', {'idContact': 9}),
+            ('delete', [1, 2])])
+        self.assertTrue(all('/Group/7/Contact/' in c.uri for c in calls))
+
+    def test_dry_run(self):
+        plan = self.reconciler.plan([1])
+        calls = len(self.client.transport.calls)
+        self.assertEqual(self.reconciler.apply(plan, dry_run=True), [])
+        self.assertEqual(len(self.client.transport.calls), calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# python
+from __future__ import unicode_literals
+import os
+import threading
+import time
+import unittest
+
+# libs
+
+# test imports
+from stubs import stub_client
+from cloudcix import deadline
+from cloudcix.batch import run_batches
+from cloudcix.deadline import Deadline, DeadlineExceeded
+from cloudcix.tokencache import TokenCache
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_budget_starts_with_the_block(self):
+        budget = Deadline(0.05)
+        time.sleep(0.06)
+        self.assertFalse(budget.expired)
+        with budget:
+            self.assertGreater(deadline.remaining(), 0.04)
+            deadline.check()
+
+    def test_nesting(self):
+        self.assertIsNone(deadline.current_deadline())
+        with Deadline(10) as outer:
+            with Deadline(60) as inner:
+                self.assertLessEqual(inner.expires, outer.expires)
+            with Deadline(1) as inner:
+                self.assertIs(deadline.current_deadline(), inner)
+                self.assertLessEqual(deadline.remaining(), 1)
+            self.assertIs(deadline.current_deadline(), outer)
+        self.assertIsNone(deadline.current_deadline())
+
+    def test_timeout_for(self):
+        self.assertEqual(deadline.timeout_for(5), 5)
+        with Deadline(1):
+            self.assertLessEqual(deadline.timeout_for(5), 1)
+            self.assertEqual(deadline.timeout_for(0.5), 0.5)
+        with Deadline(0):
+            with self.assertRaises(DeadlineExceeded):
+                deadline.timeout_for(5)
+        with Deadline(1) as budget:
+            # spent between a check and the call
+            budget.expires = time.time()
+            with self.assertRaises(DeadlineExceeded):
+                deadline.timeout_for(5)
+
+    def test_timeout_tuples(self):
+        self.assertEqual(deadline.timeout_for((3.05, 27)), (3.05, 27))
+        with Deadline(1):
+            connect, read = deadline.timeout_for((0.5, None))
+            self.assertEqual(connect, 0.5)
+            self.assertLessEqual(read, 1)
+
+    def test_bind(self):
+        seen = list()
+
+        def remaining():
+            seen.append(deadline.remaining())
+
+        with Deadline(1):
+            bound = deadline.bind(remaining)
+        for target in (remaining, bound):
+            thread = threading.Thread(target=target)
+            thread.start()
+            thread.join()
+        self.assertIsNone(seen[0])
+        self.assertLessEqual(seen[1], 1)
+
+    def test_api_calls(self):
+        client = stub_client()
+        with Deadline(1):
+            client.list(token='t', timeout=30)
+        self.assertLessEqual(client.transport.calls[0].timeout, 1)
+        with Deadline(0):
+            with self.assertRaises(DeadlineExceeded):
+                client.list(token='t')
+        self.assertEqual(len(client.transport.calls), 1)
+        client.list(token='t', timeout=(3.05, 27))
+        self.assertEqual(client.transport.calls[-1].timeout, (3.05, 27))
+        with Deadline(1):
+            client.list(token='t', timeout=(3.05, 27))
+        connect, read = client.transport.calls[-1].timeout
+        self.assertLessEqual(max(connect, read), 1)
+
+    def test_run_batches_cancellation(self):
+        def slow(batch):
+            time.sleep(0.05)
+
+        with Deadline(0.12):
+            result = run_batches(slow, ([i] for i in range(100)),
+                                 concurrency=2)
+        self.assertFalse(result.complete)
+        self.assertLess(result.items, 10)
+        self.assertTrue(all(isinstance(error, DeadlineExceeded)
+                            for _, error in result.errors))
+
+
+class _Session(object):
+
+    def __init__(self):
+        self.timeouts = list()
+
+    def get(self, url, **kwargs):
+        self.timeouts.append(kwargs.get('timeout'))
+        raise IOError('offline')
+
+
+class _Client(object):
+    session = _Session()
+
+
+class TestTokenCacheDeadline(unittest.TestCase):
+
+    def setUp(self):
+        for name in ('OPENSTACK_KEYSTONE_URL', 'CLOUDCIX_API_USERNAME',
+                     'CLOUDCIX_API_PASSWORD', 'CLOUDCIX_API_ID_MEMBER'):
+            os.environ.setdefault(name, 'http://keystone/v3')
+
+    def test_validation_timeout(self):
+        client = _Client()
+        cache = TokenCache(poll_interval=3600, client=client)
+        cache._last_poll = time.time()
+        with Deadline(2):
+            with self.assertRaises(IOError):
+                cache.validate('token')
+        self.assertLessEqual(client.session.timeouts[-1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+# python
+from __future__ import unicode_literals
+import unittest
+
+# libs
+
+# test imports
+from stubs import StubTransport, paginate
+from cloudcix import api
+from cloudcix.dnssync import Reconciler, Record, parse_zone
+
+ZONE = """
+$ORIGIN example.com.
+$TTL 1h
+@       IN  SOA ns1 hostmaster ( 1 7200 3600 1209600 3600 )
+        IN  NS  ns1
+        IN  MX  10 mail
+www     300 IN  A   1.2.3.4
+mail    IN  1h30m A 1.2.3.5
+ftp         CNAME www.example.com.
+"""
+
+
+class TestParseZone(unittest.TestCase):
+
+    def test_records(self):
+        records = parse_zone(ZONE)
+        self.assertEqual(
+            [(r['name'], r['type'], r['content'], r['ttl'], r['priority'])
+             for r in records[1:]],
+            [('example.com.', 'NS', 'ns1.example.com.', 3600, None),
+             ('example.com.', 'MX', 'mail.example.com.', 3600, 10),
+             ('www.example.com.', 'A', '1.2.3.4', 300, None),
+             ('mail.example.com.', 'A', '1.2.3.5', 5400, None),
+             ('ftp.example.com.', 'CNAME', 'www.example.com.', 3600, None)])
+
+    def test_relative_names_without_origin(self):
+        record = parse_zone('www 60 A 1.2.3.4')[0]
+        self.assertEqual(record['name'], 'www')
+        self.assertEqual(record['ttl'], 60)
+
+    def test_null_mx(self):
+        record = parse_zone('@ MX 0 .', origin='example.com')[0]
+        self.assertEqual((record['priority'], record['content']), (0, '.'))
+
+    def test_errors(self):
+        for text in ('$INCLUDE other.zone', '$TTL soon',
+                     'www 1x IN A 1.1.1.1', 'www IN WRONG 1.1.1.1',
+                     'www IN A'):
+            with self.assertRaises(ValueError):
+                parse_zone(text, origin='example.com')
+
+
+class DNSTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.current = list()
+        self.failing = set()
+        self.transports = api.dns.record.transport, \
+            api.dns.recordptr.transport
+        self.record_transport = StubTransport(self.handle_record)
+        self.ptr_transport = StubTransport(lambda call: (
+            200, {'content': []}))
+        api.dns.record.transport = self.record_transport
+        api.dns.recordptr.transport = self.ptr_transport
+        self.reconciler = Reconciler(1, token='t', origin='example.com',
+                                     concurrency=2)
+
+    def tearDown(self):
+        api.dns.record.transport, api.dns.recordptr.transport = \
+            self.transports
+
+    def handle_record(self, call):
+        if call.method in self.failing:
+            return 500, None
+        if call.method == 'get':
+            return paginate(call, self.current)
+        return 200, {'content': call.data}
+
+    def add_current(self, pk, name, rtype, content, ttl=3600, priority=None):
+        self.current.append({'idRecord': pk, 'name': name, 'type': rtype,
+                             'content': content, 'ttl': ttl,
+                             'priority': priority})
+
+
+class TestPlan(DNSTestCase):
+
+    def test_zone_with_origin(self):
+        self.add_current(1, 'www.example.com', 'A', '1.2.3.4', 300)
+        self.add_current(2, 'mail.example.com', 'A', '1.2.3.5', 5400)
+        self.add_current(3, 'example.com', 'MX', 'mail.example.com', 3600, 10)
+        self.add_current(4, 'example.com', 'NS', 'ns1.example.com')
+        self.add_current(5, 'ftp', 'CNAME', 'www')
+        plan = self.reconciler.plan(parse_zone(ZONE, origin='example.com'))
+        self.assertEqual(len(plan), 0, plan.report())
+        self.assertEqual(plan.unchanged, 5)
+
+    def test_changes(self):
+        self.add_current(1, 'www', 'A', '1.2.3.4')
+        self.add_current(2, 'old', 'A', '1.2.3.9')
+        self.add_current(3, 'mail', 'A', '1.2.3.5', 60)
+        plan = self.reconciler.plan([
+            {'name': 'www', 'type': 'A', 'content': '1.2.3.6'},
+            {'name': 'mail', 'type': 'A', 'content': '1.2.3.5'},
+            {'name': 'new', 'type': 'AAAA', 'content': '::1'},
+        ])
+        new = Record('new.example.com', 'AAAA', '::1', 3600, None)
+        self.assertEqual(plan.creates, [new])
+        self.assertEqual([(pk, r.name) for pk, r in plan.deletes],
+                         [(2, 'old.example.com')])
+        self.assertEqual(sorted((pk, n.content) for pk, o, n in plan.updates),
+                         [(1, '1.2.3.6'), (3, '1.2.3.5')])
+        self.assertEqual(plan.ptr_sets, [('1.2.3.6', 'www.example.com'),
+                                         ('::1', 'new.example.com')])
+        self.assertEqual(plan.ptr_deletes, [('1.2.3.4', 'www.example.com'),
+                                            ('1.2.3.9', 'old.example.com')])
+
+
+class TestApply(DNSTestCase):
+
+    def replace_with_cname(self):
+        self.add_current(1, 'www', 'A', '1.2.3.4')
+        return self.reconciler.plan([
+            {'name': 'www', 'type': 'CNAME', 'content': 'web.example.com.'}])
+
+    def test_deletes_before_creates(self):
+        errors = self.reconciler.apply(self.replace_with_cname())
+        self.assertEqual(errors, [])
+        self.assertEqual([c.method for c in self.record_transport.calls],
+                         ['get', 'delete', 'post'])
+        self.assertEqual(self.record_transport.calls[1].data, [1])
+        self.assertEqual(self.record_transport.calls[2].data['content'],
+                         'web.example.com.')
+        self.assertEqual(self.ptr_transport.calls[0].params,
+                         {'name': '4.3.2.1.in-addr.arpa'})
+
+    def test_ptr_create(self):
+        plan = self.reconciler.plan([
+            {'name': 'www', 'type': 'A', 'content': '1.2.3.4'}])
+        self.assertEqual(self.reconciler.apply(plan), [])
+        create = self.ptr_transport.calls[-1]
+        self.assertEqual(create.method, 'post')
+        self.assertEqual(create.data, {'name': '4.3.2.1.in-addr.arpa',
+                                       'type': 'PTR',
+                                       'content': 'www.example.com.'})
+
+    def test_ptr_of_failed_records_are_kept(self):
+        plan = self.replace_with_cname()
+        self.failing.add('delete')
+        errors = self.reconciler.apply(plan)
+        self.assertEqual([batch for batch, _ in errors],
+                         [[('delete', plan.deletes[0])]])
+        self.assertEqual(self.ptr_transport.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# python
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# libs
+import requests
+
+# test imports
+from stubs import StubTransport, stub_client
+from cloudcix.replay import Player, Recorder, ReplayMiss
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'calls.ndjson.gz')
+        self.count = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def handle(self, call):
+        self.count += 1
+        body = {'content': {'count': self.count, 'params': call.params}}
+        return 200, body, {'X-Count': '%d' % self.count}
+
+    def record(self):
+        recorder = Recorder(self.path, transport=StubTransport(self.handle))
+        with recorder:
+            client = stub_client()
+            client.transport = recorder.transport
+            for _ in range(2):
+                client.read(token='t', pk=1)
+            client.list(token='t', params={'page': 0})
+            client.list(token='t', params={'page': 1})
+        return recorder, client
+
+    def player_client(self, **kwargs):
+        player = Player(self.path, **kwargs)
+        client = stub_client()
+        client.transport = player.transport
+        return player, client
+
+    def test_round_trip(self):
+        recorder, _ = self.record()
+        self.assertEqual(recorder.exchanges, 4)
+        player, client = self.player_client(speed=None)
+        # exchanges of the same request in order, starting over after the last
+        counts = [client.read(token='t', pk=pk).json()['content']['count']
+                  for pk in (1, 2, 3)]
+        self.assertEqual(counts, [1, 2, 1])
+        response = client.list(token='t', params={'page': 1})
+        self.assertEqual(response.json()['content']['count'], 4)
+        self.assertEqual(response.headers['x-count'], '4')
+        player.reset()
+        self.assertEqual(
+            client.read(token='t', pk=1).json()['content']['count'], 1)
+
+    def test_params_matching(self):
+        self.record()
+        _, client = self.player_client(speed=None)
+        with self.assertRaises(ReplayMiss):
+            client.list(token='t', params={'page': 2})
+        _, client = self.player_client(speed=None, strict=False)
+        response = client.list(token='t', params={'page': 2})
+        self.assertEqual(response.json()['content']['count'], 3)
+
+    def test_latency(self):
+        self.record()
+        player, client = self.player_client()
+        for exchanges in player._index.values():
+            for exchange in exchanges:
+                exchange.latency = 0.05
+        started = time.time()
+        client.read(token='t', pk=1)
+        self.assertGreaterEqual(time.time() - started, 0.05)
+        with self.assertRaises(requests.Timeout):
+            client.read(token='t', pk=1, timeout=0.01)
+
+    def test_closed_recorder(self):
+        recorder, client = self.record()
+        client.read(token='t', pk=1)
+        self.assertEqual((recorder.exchanges, self.count), (4, 5))
+
+    def test_session(self):
+        recorder = Recorder(self.path, transport=StubTransport())
+        with recorder:
+            response = StubTransport(self.handle).request(
+                'GET', 'http://keystone/v3/auth/tokens', {})
+            recorder.record('GET', None, response.url, None, time.time(),
+                            response)
+        session = Player(self.path, speed=None).session()
+        response = session.get('http://keystone/v3/auth/tokens')
+        self.assertEqual(response.json()['content']['count'], 1)
+        with self.assertRaises(ReplayMiss):
+            session.get('http://keystone/v3/projects')
+
+
+if __name__ == '__main__':
+    unittest.main()
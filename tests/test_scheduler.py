@@ -0,0 +1,84 @@
+# python
+from __future__ import unicode_literals
+import threading
+import time
+import unittest
+
+# libs
+
+# test imports
+import stubs  # noqa: sets up the path
+from cloudcix.scheduler import BATCH, INTERACTIVE, QueueTimeout, Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_reserved_slots(self):
+        scheduler = Scheduler(capacity=3)
+        # batch can only use the shared slot, the 2 others are reserved
+        scheduler.acquire(BATCH, 0.1)
+        with self.assertRaises(QueueTimeout):
+            scheduler.acquire(BATCH, 0.01)
+        scheduler.acquire(INTERACTIVE, 0.1)
+        scheduler.acquire(INTERACTIVE, 0.1)
+        with self.assertRaises(QueueTimeout):
+            scheduler.acquire(INTERACTIVE, 0.01)
+        stats = scheduler.stats()
+        self.assertEqual((stats[INTERACTIVE]['active'],
+                          stats[BATCH]['active']), (2, 1))
+
+    def test_queue_timeout_cleans_up(self):
+        scheduler = Scheduler(capacity=1, lanes={BATCH: {}},
+                              default_lane=BATCH)
+        scheduler.acquire()
+        with self.assertRaises(QueueTimeout):
+            scheduler.acquire(timeout=0.01)
+        self.assertEqual(scheduler.stats()[BATCH]['waiting'], 0)
+        scheduler.release()
+        # the timed out call didn't take the freed slot
+        scheduler.acquire(timeout=0.1)
+        stats = scheduler.stats()[BATCH]
+        self.assertEqual((stats['active'], stats['calls'],
+                          stats['max_waiting']), (1, 2, 1))
+
+    def test_weighted_share(self):
+        scheduler = Scheduler(capacity=1, lanes={
+            INTERACTIVE: {'weight': 4}, BATCH: {'weight': 1}})
+        scheduler.acquire(BATCH)
+        order = list()
+        lock = threading.Lock()
+
+        def call(lane):
+            scheduler.acquire(lane, 5)
+            with lock:
+                order.append(lane)
+            scheduler.release(lane)
+
+        threads = [threading.Thread(target=call, args=(lane,))
+                   for lane in [INTERACTIVE] * 8 + [BATCH] * 8]
+        for thread in threads:
+            thread.start()
+        while sum(l['waiting'] for l in scheduler.stats().values()) < 16:
+            time.sleep(0.001)
+        scheduler.release(BATCH)
+        for thread in threads:
+            thread.join()
+        # while both lanes wait, interactive gets 4 slots for every batch one
+        self.assertEqual(order[:10].count(INTERACTIVE), 8)
+        self.assertEqual(order[10:], [BATCH] * 6)
+
+    def test_stats(self):
+        scheduler = Scheduler()
+        with scheduler.slot(INTERACTIVE):
+            self.assertEqual(scheduler.stats()[INTERACTIVE]['active'], 1)
+        stats = scheduler.stats()[INTERACTIVE]
+        self.assertEqual((stats['active'], stats['calls']), (0, 1))
+        self.assertGreaterEqual(stats['wait_avg'], 0.0)
+
+    def test_capacity_check(self):
+        with self.assertRaises(ValueError):
+            Scheduler(capacity=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
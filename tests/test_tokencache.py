@@ -0,0 +1,207 @@
+# python
+from __future__ import unicode_literals
+import datetime
+import os
+import threading
+import time
+import unittest
+
+# libs
+
+# test imports
+import stubs  # noqa: sets up the path
+from cloudcix.tokencache import TokenCache, _Entry
+
+for name in ('OPENSTACK_KEYSTONE_URL', 'CLOUDCIX_API_USERNAME',
+             'CLOUDCIX_API_PASSWORD', 'CLOUDCIX_API_ID_MEMBER'):
+    os.environ.setdefault(name, 'http://keystone/v3')
+
+
+class _AuthRef(dict):
+    """Subset of keystoneclient.access.AccessInfoV3 used by the cache"""
+
+    def __init__(self, token, expires_in=3600, user_id='user',
+                 project_id='project', role_ids=('member',),
+                 issued=None, audit_ids=None):
+        super(_AuthRef, self).__init__(audit_ids=audit_ids or [token])
+        now = datetime.datetime.utcnow()
+        self.token = token
+        self.expires = now + datetime.timedelta(seconds=expires_in)
+        self.issued = issued or now
+        self.user_id = user_id
+        self.project_id = project_id
+        self.role_ids = list(role_ids)
+
+
+class _Response(object):
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class _Session(object):
+
+    def __init__(self):
+        self.events = list()
+        self.error = None
+        self.calls = list()
+
+    def get(self, url, **kwargs):
+        self.calls.append(kwargs)
+        if self.error is not None:
+            raise self.error
+        return _Response({'events': self.events})
+
+
+class _Client(object):
+
+    def __init__(self):
+        self.session = _Session()
+
+
+class TokenCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = _Client()
+        self.validated = list()
+        self.expires_in = 3600
+
+    def cache(self, **kwargs):
+        cache = TokenCache(poll_interval=3600, client=self.client, **kwargs)
+        cache._last_poll = time.time()
+        cache._validate = self.validate
+        return cache
+
+    def validate(self, token):
+        self.validated.append(token)
+        return _AuthRef(token, self.expires_in)
+
+
+class TestValidate(TokenCacheTestCase):
+
+    def test_lru(self):
+        cache = self.cache(max_size=2)
+        for token in ('a', 'b', 'a', 'c', 'a', 'b'):
+            self.assertEqual(cache.validate(token).token, token)
+        self.assertEqual(self.validated, ['a', 'b', 'c', 'b'])
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+        self.assertEqual(list(cache._entries), ['a', 'b'])
+
+    def test_stale_tokens_are_validated_again(self):
+        cache = self.cache(stale_duration=30)
+        self.expires_in = 20
+        cache.validate('a')
+        cache.validate('a')
+        self.assertEqual(self.validated, ['a', 'a'])
+        self.expires_in = 60
+        cache.validate('b')
+        cache.validate('b')
+        self.assertEqual(self.validated, ['a', 'a', 'b'])
+
+    def test_invalidate(self):
+        cache = self.cache()
+        cache.validate('a')
+        cache.invalidate('a')
+        cache.validate('a')
+        self.assertEqual(self.validated, ['a', 'a'])
+
+    def test_concurrent_validations(self):
+        cache = self.cache()
+        release = threading.Event()
+        results = list()
+
+        def validate(token):
+            release.wait(5)
+            return self.validate(token)
+
+        cache._validate = validate
+        threads = [threading.Thread(target=lambda: results.append(
+            cache.validate('a'))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while cache.misses < 5:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.validated, ['a'])
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_concurrent_failure(self):
+        cache = self.cache()
+        release = threading.Event()
+        errors = list()
+
+        def validate(token):
+            release.wait(5)
+            raise KeyError(token)
+
+        def call():
+            try:
+                cache.validate('a')
+            except KeyError as e:
+                errors.append(e)
+
+        cache._validate = validate
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while cache.misses < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache._pending, {})
+
+
+class TestRevocation(TokenCacheTestCase):
+
+    def test_revoked_by(self):
+        issued = datetime.datetime(2015, 3, 5, 10, 0, 0)
+        entry = _Entry(_AuthRef('a', issued=issued,
+                                audit_ids=['audit', 'chain']))
+        for event, revoked in [
+                ({'audit_id': 'audit'}, True),
+                ({'audit_id': 'other'}, False),
+                ({'audit_chain_id': 'chain'}, True),
+                ({'audit_chain_id': 'audit'}, False),
+                ({'user_id': 'user'}, True),
+                ({'user_id': 'user', 'project_id': 'other'}, False),
+                ({'role_id': 'member'}, True),
+                ({'role_id': 'admin'}, False),
+                ({'user_id': 'user',
+                  'issued_before': '2015-03-05T10:02:03.000000Z'}, True),
+                ({'user_id': 'user',
+                  'issued_before': '2015-03-05T09:59:00Z'}, False)]:
+            self.assertEqual(entry.revoked_by(event), revoked, event)
+
+    def test_poll(self):
+        cache = self.cache()
+        cache.validate('a')
+        cache.validate('b')
+        self.client.session.events = [{'audit_id': 'b'}]
+        self.assertEqual(cache.poll_revocations(), 1)
+        self.assertEqual(list(cache._entries), ['a'])
+        self.assertEqual(self.client.session.calls[-1]['timeout'], 5)
+        # the next poll asks for the events since the previous one
+        cache.poll_revocations()
+        self.assertIn('since', self.client.session.calls[-1]['params'])
+
+    def test_failed_poll_clears_the_cache(self):
+        cache = self.cache()
+        cache.validate('a')
+        self.client.session.error = IOError('offline')
+        cache._last_poll = 0
+        cache.validate('b')
+        self.assertEqual(list(cache._entries), ['b'])
+        self.assertGreater(cache._last_poll, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
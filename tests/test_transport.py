@@ -0,0 +1,230 @@
+# python
+from __future__ import unicode_literals
+import json
+import os
+import socket
+import threading
+import time
+import unittest
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlparse
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qsl, urlparse
+
+# libs
+import requests
+from requests.structures import CaseInsensitiveDict
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# test imports
+import stubs  # noqa: sets up the path
+from cloudcix.transport import (HttpxTransport, RequestsTransport, Response,
+                                Urllib3Transport)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path == '/redirect/':
+            self.send_response(302)
+            self.send_header('Location', '/echo/?redirected=1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if parsed.path == '/slow/':
+            time.sleep(0.5)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.dumps({
+            'method': self.command,
+            'path': self.path,
+            'params': dict(parse_qsl(parsed.query)),
+            'body': self.rfile.read(length).decode('utf-8'),
+            'header': self.headers.get('X-Test'),
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients giving up on /slow/ close the connection
+        pass
+
+
+def setUpModule():
+    global server, url
+    server = _Server(('127.0.0.1', 0), _Handler)
+    url = 'http://127.0.0.1:%d' % server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+
+def tearDownModule():
+    server.shutdown()
+    server.server_close()
+
+
+def _closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestResponse(unittest.TestCase):
+
+    def test_response(self):
+        headers = CaseInsensitiveDict({
+            'Content-Type': 'text/plain; charset=latin-1'})
+        response = Response(404, headers, 'caf\xe9'.encode('latin-1'),
+                            'http://stub/', 'Not Found')
+        self.assertEqual((response.encoding, response.text),
+                         ('latin-1', 'caf\xe9'))
+        self.assertFalse(response.ok)
+        self.assertEqual(list(response.iter_content(3)), [b'caf', b'\xe9'])
+        with self.assertRaises(requests.HTTPError) as raised:
+            response.raise_for_status()
+        self.assertIn('404 Not Found for url: http://stub/',
+                      str(raised.exception))
+        self.assertIs(raised.exception.response, response)
+
+    def test_json(self):
+        response = Response(200, {}, b'{"content": [1]}', 'http://stub/')
+        self.assertTrue(response.ok)
+        self.assertEqual(response.json(), {'content': [1]})
+        response.raise_for_status()
+
+
+class TransportTests(object):
+    """Contract of the transports, run against a local server"""
+
+    def transport(self, **kwargs):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.client = self.transport()
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_request(self):
+        response = self.client.request(
+            'post', url + '/echo/?a=1', {'X-Test': 'yes'}, data='{"b": 2}',
+            params={'c': [3, 4]}, timeout=(5, 5))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.reason, 'OK')
+        self.assertEqual(response.encoding, 'utf-8')
+        body = response.json()
+        self.assertEqual((body['method'], body['body'], body['header']),
+                         ('POST', '{"b": 2}', 'yes'))
+        self.assertEqual(body['path'], '/echo/?a=1&c=3&c=4')
+        self.assertEqual(response.request.method, 'POST')
+
+    def test_redirects(self):
+        response = self.client.request('get', url + '/redirect/', {},
+                                       timeout=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.url, url + '/echo/?redirected=1')
+        self.assertEqual(response.json()['params'], {'redirected': '1'})
+        response = self.client.request('get', url + '/redirect/', {},
+                                       timeout=5, allow_redirects=False)
+        self.assertEqual(response.status_code, 302)
+
+    def test_timeout(self):
+        with self.assertRaises(requests.Timeout):
+            self.client.request('get', url + '/slow/', {}, timeout=0.1)
+
+    def test_connection_error(self):
+        with self.assertRaises(requests.ConnectionError):
+            self.client.request('get', 'http://127.0.0.1:%d/' %
+                                _closed_port(), {}, timeout=5)
+
+
+class TestRequestsTransport(TransportTests, unittest.TestCase):
+
+    def transport(self, **kwargs):
+        return RequestsTransport()
+
+
+class TestUrllib3Transport(TransportTests, unittest.TestCase):
+
+    def transport(self, **kwargs):
+        return Urllib3Transport(**kwargs)
+
+    def test_unsupported_arguments(self):
+        with self.assertRaises(TypeError):
+            self.client.request('get', url + '/echo/', {}, stream=True)
+
+    def test_verify_and_cert(self):
+        client = self.transport(trust_env=False)
+        options = client.pool.connection_pool_kw
+        self.assertEqual(options['cert_reqs'], 'CERT_REQUIRED')
+        self.assertTrue(options['ca_certs'])
+        options = client._get_pool(False, None, None).connection_pool_kw
+        self.assertEqual(options['cert_reqs'], 'CERT_NONE')
+        options = client._get_pool('/etc/ca.pem', ('/etc/c.pem', '/etc/k.pem'),
+                                   None).connection_pool_kw
+        self.assertEqual((options['ca_certs'], options['cert_file'],
+                          options['key_file']),
+                         ('/etc/ca.pem', '/etc/c.pem', '/etc/k.pem'))
+        self.assertIs(client._get_pool(False, None, None),
+                      client._get_pool(False, None, None))
+
+    def test_proxies(self):
+        response = self.client.request('get', 'http://example.invalid/p/', {},
+                                       timeout=5, proxies={'http': url})
+        self.assertEqual(response.json()['path'], 'http://example.invalid/p/')
+        environ = dict(os.environ)
+        os.environ['HTTP_PROXY'] = url
+        os.environ.pop('NO_PROXY', None)
+        os.environ.pop('no_proxy', None)
+        try:
+            response = self.transport().request(
+                'get', 'http://example.invalid/e/', {}, timeout=5)
+            self.assertEqual(response.json()['path'],
+                             'http://example.invalid/e/')
+            with self.assertRaises(requests.ConnectionError):
+                self.transport(trust_env=False).request(
+                    'get', 'http://example.invalid/e/', {}, timeout=5)
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+
+@unittest.skipIf(httpx is None, 'httpx is not installed')
+class TestHttpxTransport(TransportTests, unittest.TestCase):
+
+    def transport(self, **kwargs):
+        return HttpxTransport(**kwargs)
+
+    def test_unsupported_arguments(self):
+        with self.assertRaises(TypeError):
+            self.client.request('get', url + '/echo/', {}, proxies={})
+
+    def test_verify(self):
+        self.assertIsNot(self.client._get_client(False, None),
+                         self.client.client)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+# python
+from __future__ import unicode_literals
+import gc
+import json
+import os
+import unittest
+
+# libs
+import requests
+from requests.adapters import HTTPAdapter
+
+# test imports
+import stubs  # noqa: sets up the path
+from cloudcix import utils
+from cloudcix.api import get_services
+from cloudcix.scheduler import INTERACTIVE, Scheduler
+from cloudcix.tokencache import TokenCache
+from cloudcix.transport import RequestsTransport, get_default_transport
+from cloudcix.utils import reset_requests_session
+from cloudcix.warmup import warm_up
+
+
+class _KeystoneSession(object):
+
+    def __init__(self):
+        self.session = requests.Session()
+
+
+class _KeystoneClient(object):
+
+    def __init__(self):
+        self.session = _KeystoneSession()
+
+
+def _mark(session):
+    """Marks the pool managers of the session as inherited"""
+    for adapter in session.adapters.values():
+        adapter.poolmanager.inherited = True
+
+
+def _inherited(session):
+    """Whether the session still uses any marked pool manager"""
+    return any(getattr(adapter.poolmanager, 'inherited', False)
+               for adapter in session.adapters.values())
+
+
+class TestResetRequestsSession(unittest.TestCase):
+
+    def test_mounted_adapters_are_kept(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=20, max_retries=3)
+        session.mount('https://api.example.com', adapter)
+        _mark(session)
+        reset_requests_session(session)
+        self.assertIs(session.get_adapter('https://api.example.com/'),
+                      adapter)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertEqual(adapter.poolmanager.connection_pool_kw['maxsize'],
+                         20)
+        self.assertFalse(_inherited(session))
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+class TestAfterFork(unittest.TestCase):
+
+    def setUp(self):
+        self.admin_session = utils._admin_session
+
+    def tearDown(self):
+        utils._admin_session = self.admin_session
+
+    def fork(self, child):
+        """Runs child in a forked process, returns what it returned"""
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            try:
+                # automatic on Python 3.7+, runs once per process
+                utils.after_fork()
+                result = json.dumps(child()).encode('utf-8')
+            except BaseException as e:
+                result = json.dumps({'error': repr(e)}).encode('utf-8')
+            os.write(write, result)
+            os._exit(0)
+        os.close(write)
+        chunks = list()
+        while True:
+            chunk = os.read(read, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        os.close(read)
+        os.waitpid(pid, 0)
+        return json.loads(b''.join(chunks).decode('utf-8'))
+
+    def test_after_fork(self):
+        transport = get_default_transport()
+        self.assertIsInstance(transport, RequestsTransport)
+        utils._admin_session = _KeystoneSession()
+        cache = TokenCache(client=_KeystoneClient())
+        cache._entries['token'] = object()
+        scheduler = Scheduler()
+        scheduler.acquire(INTERACTIVE)
+
+        for session in (transport.session, utils._admin_session.session,
+                        cache.client.session.session):
+            _mark(session)
+
+        def state():
+            return {
+                'transport': _inherited(transport.session),
+                'admin': _inherited(utils._admin_session.session),
+                'cache': [len(cache), cache._lock.locked(),
+                          cache._poll_lock.locked(),
+                          _inherited(cache.client.session.session)],
+                'scheduler': scheduler.stats()[INTERACTIVE]['active'],
+            }
+
+        parent = state()
+        # locks held by other threads of the parent at the time of the fork
+        locks = [cache._lock, cache._poll_lock, scheduler._lock]
+        for lock in locks:
+            lock.acquire()
+        try:
+            child = self.fork(state)
+        finally:
+            for lock in locks:
+                lock.release()
+        self.assertNotIn('error', child)
+        self.assertEqual((child['transport'], child['admin']), (False, False))
+        # cached tokens are kept, with new locks and connections
+        self.assertEqual(child['cache'][0], 1)
+        self.assertEqual(child['cache'][1:], [False, False, False])
+        # slots taken in the parent aren't released in the child, the lock
+        # of the scheduler is new or stats would block
+        self.assertEqual((parent['scheduler'], child['scheduler']), (1, 0))
+        # the parent is left alone
+        self.assertEqual(state(), parent)
+        self.assertTrue(parent['transport'])
+        scheduler.release(INTERACTIVE)
+
+
+class TestWarmUp(unittest.TestCase):
+
+    def test_warm_up(self):
+        clients = list(get_services().values())
+        for client in clients:
+            client._service_args = None
+        frozen = gc.get_freeze_count() if hasattr(gc, 'freeze') else None
+        timings = warm_up(resolve=False)
+        self.assertEqual(sorted(timings), ['clients', 'settings'])
+        self.assertTrue(all(client._service_args is not None
+                            for client in clients))
+        if frozen is not None:
+            self.assertEqual(gc.get_freeze_count(), frozen)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# python
+from __future__ import unicode_literals
+import unittest
+
+# libs
+
+# test imports
+from stubs import paginate, stub_client
+from cloudcix.watch import CREATED, DELETED, UPDATED, Watcher
+
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [{'idRecord': i, 'name': 'r%d' % i} for i in range(5)]
+        self.changed_since = None
+        self.max_limit = None
+        self.client = stub_client(self.handle)
+
+    def handle(self, call):
+        if 'modified' in call.params:
+            return paginate(call, self.changed_since or [])
+        status, body = paginate(call, self.records, self.max_limit)
+        etag = '"%d"' % hash(repr(body))
+        if call.headers.get('If-None-Match') == etag:
+            return 304, None, {'ETag': etag}
+        return status, body, {'ETag': etag}
+
+    def watcher(self, **kwargs):
+        kwargs.setdefault('page_size', 2)
+        return Watcher(self.client, 'idRecord', token='t', **kwargs)
+
+    def test_initial_poll(self):
+        events = self.watcher().poll()
+        self.assertEqual([e.type for e in events], [CREATED] * 5)
+        self.assertEqual(self.watcher(emit_initial=False).poll(), [])
+
+    def test_unchanged_pages_are_reused(self):
+        watcher = self.watcher()
+        watcher.poll()
+        self.records[4]['name'] = 'changed'
+        events = watcher.poll()
+        self.assertEqual([(e.type, e.pk) for e in events], [(UPDATED, 4)])
+        second_poll = self.client.transport.calls[3:]
+        self.assertEqual(len(second_poll), 3)
+        self.assertTrue(all('If-None-Match' in c.headers
+                            for c in second_poll))
+
+    def test_deletions(self):
+        watcher = self.watcher()
+        watcher.poll()
+        del self.records[1:3]
+        events = watcher.poll()
+        self.assertEqual(sorted((e.type, e.pk) for e in events),
+                         [(DELETED, 1), (DELETED, 2)])
+        self.assertEqual(len(watcher), 3)
+
+    def test_server_page_cap(self):
+        self.records = [{'idRecord': i} for i in range(10)]
+        self.max_limit = 2
+        watcher = self.watcher(page_size=5)
+        self.assertEqual(len(watcher.poll()), 10)
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(len(watcher), 10)
+
+    def test_incremental(self):
+        watcher = self.watcher(modified_since_param='modified',
+                               full_sync_every=3)
+        deleted = list()
+        watcher.on(DELETED, deleted.append)
+        watcher.poll()
+        self.changed_since = [{'idRecord': 0, 'name': 'new name'},
+                              {'idRecord': 9, 'name': 'r9'}]
+        events = watcher.poll()
+        self.assertEqual([(e.type, e.pk) for e in events],
+                         [(UPDATED, 0), (CREATED, 9)])
+        self.assertIn('modified', self.client.transport.calls[-1].params)
+        # an incremental poll can't see deletions, the next full sync does
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(deleted, [])
+        watcher.poll()
+        self.assertEqual([e.pk for e in deleted], [9])
+
+
+if __name__ == '__main__':
+    unittest.main()